@@ -0,0 +1,92 @@
+import logging
+import threading
+from sqlalchemy.exc import DBAPIError, DisconnectionError, InterfaceError, OperationalError, TimeoutError
+
+logger = logging.getLogger(__name__)
+
+# Failures worth retrying with the same rows: lost connections, deadlocks, lock and pool timeouts
+TRANSIENT_ERRORS = (OperationalError, InterfaceError, DisconnectionError, TimeoutError)
+
+def is_transient(exc: Exception) -> bool:
+    if isinstance(exc, DBAPIError) and exc.connection_invalidated:
+        return True
+    return isinstance(exc, TRANSIENT_ERRORS)
+
+class FlushBuffer:
+    """Collects writes in memory and persists them in batches.
+
+    Items are flushed when ``max_items`` is reached or, from a daemon thread,
+    every ``max_age`` seconds. Subclasses implement ``_collect`` / ``_drain``
+    (called under the lock) and ``_write`` (called outside of it).
+
+    A batch that fails with a transient error (see ``is_transient``) is re-queued
+    while fewer than ``max_pending`` items are waiting; any other failure, such as
+    an IntegrityError from one bad row, would fail again, so the batch is logged
+    and dropped. ``dropped`` counts the items lost either way.
+    """
+
+    def __init__(self, max_items: int = 500, max_age: float = 2.0, max_pending: int = None):
+        self.max_items = max_items
+        self.max_age = max_age
+        self.max_pending = max_pending if max_pending is not None else max_items * 20
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._size = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add(self, item):
+        with self._lock:
+            self._collect(item)
+            self._size += 1
+            full = self._size >= self.max_items
+        if full:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            if not self._size:
+                return
+            batch = self._drain()
+            size, self._size = self._size, 0
+        try:
+            self._write(batch)
+        except Exception as exc:
+            with self._lock:
+                if is_transient(exc) and self._size + size <= self.max_pending:
+                    logger.exception("%s flush failed, re-queueing batch", type(self).__name__)
+                    self._requeue(batch)
+                    return
+                self.dropped += size
+            logger.exception("%s flush failed, dropping %d items: %r", type(self).__name__, size, batch)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name=type(self).__name__, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.max_age * 2)
+            self._thread = None
+        self.flush()
+
+    def _run(self):
+        while not self._stop.wait(self.max_age):
+            self.flush()
+
+    def _requeue(self, batch):
+        for item in batch:
+            self._collect(item)
+            self._size += 1
+
+    def _collect(self, item):
+        raise NotImplementedError
+
+    def _drain(self):
+        raise NotImplementedError
+
+    def _write(self, batch):
+        raise NotImplementedError
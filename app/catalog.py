@@ -0,0 +1,72 @@
+from typing import Iterable
+from sqlalchemy.orm import Session
+from sqlalchemy import UniqueConstraint, and_, func, inspect, select, text
+from app.models import Author, Book
+from app.schemas import AuthorOut, BookOut
+
+# Upper bound on IDs per batch lookup, so one request stays one bounded IN query
+MAX_BATCH_IDS = 100
+
+def unique_ids(ids: Iterable[int]) -> list:
+    return list(dict.fromkeys(ids))
+
+def fetch_books(db: Session, ids: list) -> dict:
+    """``{book_id: BookOut dict}`` for the existing ``ids``, author name joined, in one query."""
+    stmt = (
+        select(Book.id, Book.title, Book.isbn, Book.author_id, Author.name.label("author_name"),
+               Book.published_date, Book.available)
+        .outerjoin(Author, Author.id == Book.author_id)
+        .where(Book.id.in_(ids))
+    )
+    return {row.id: BookOut(**row._mapping).dict() for row in db.execute(stmt)}
+
+def fetch_authors(db: Session, ids: list) -> dict:
+    """``{author_id: AuthorOut dict}`` for the existing ``ids``, in one query."""
+    stmt = select(Author.id, Author.name, Author.bio).where(Author.id.in_(ids))
+    return {row.id: AuthorOut(**row._mapping).dict() for row in db.execute(stmt)}
+
+def in_request_order(ids: list, found: dict):
+    """The found records in the order requested, and the IDs that do not exist."""
+    return [found[i] for i in ids if i in found], [i for i in ids if i not in found]
+
+def add_book_unique_constraints(db: Session) -> dict:
+    """Add the ``books`` unique constraints missing from a table created before them.
+
+    ``create_all`` never alters an existing table. A constraint whose columns
+    already hold duplicates is not added; ``{name: [[book ids], ...]}`` lists
+    those duplicates so they can be resolved by hand before running this again.
+    """
+    bind = db.get_bind()
+    inspector = inspect(bind)
+    existing = {constraint["name"] for constraint in inspector.get_unique_constraints("books")}
+    existing.update(index["name"] for index in inspector.get_indexes("books") if index["unique"])
+    duplicates = {}
+    for constraint in Book.__table__.constraints:
+        if not isinstance(constraint, UniqueConstraint) or constraint.name in existing:
+            continue
+        columns = list(constraint.columns)
+        keys = (
+            select(*columns)
+            .where(*[column.isnot(None) for column in columns])
+            .group_by(*columns)
+            .having(func.count() > 1)
+            .subquery()
+        )
+        rows = db.execute(
+            select(Book.id, *columns)
+            .join(keys, and_(*[column == keys.c[column.name] for column in columns]))
+            .order_by(*columns, Book.id)
+        ).all()
+        if rows:
+            groups = {}
+            for row in rows:
+                groups.setdefault(tuple(row[1:]), []).append(row[0])
+            duplicates[constraint.name] = list(groups.values())
+            continue
+        names = ", ".join(column.name for column in columns)
+        if bind.dialect.name == "sqlite":
+            # SQLite cannot add a constraint to an existing table; a unique index enforces the same rule
+            db.execute(text(f"CREATE UNIQUE INDEX {constraint.name} ON books ({names})"))
+        else:
+            db.execute(text(f"ALTER TABLE books ADD CONSTRAINT {constraint.name} UNIQUE ({names})"))
+    return duplicates
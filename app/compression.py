@@ -0,0 +1,188 @@
+"""Response compression negotiated through ``Accept-Encoding``.
+
+gzip is always available; ``brotli`` and ``zstandard`` are used when installed.
+Bodies under ``minimum_size`` go out as they are, bodies over ``offload_size`` are
+compressed in a worker thread. A response with an ETag (see app/versions.py) is
+compressed once per encoding and the bytes are reused from an LRU cache; its ETag
+gets an ``-<encoding>`` suffix so each representation keeps a strong validator.
+Cached bodies are keyed by method, path and query string as well as the ETag:
+an ETag only validates the body of its own URL.
+"""
+import gzip
+from collections import OrderedDict
+from anyio import to_thread
+from app.metrics import record_cache
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSORS = {"gzip": lambda body: gzip.compress(body, compresslevel=6, mtime=0)}
+if brotli is not None:
+    COMPRESSORS["br"] = lambda body: brotli.compress(body, quality=5)
+if zstandard is not None:
+    COMPRESSORS["zstd"] = lambda body: zstandard.ZstdCompressor(level=3).compress(body)
+
+PREFERENCE = ("zstd", "br", "gzip")   # server preference when the client's q-values tie
+COMPRESSIBLE_TYPES = ("application/json", "text/")
+
+def negotiate(accept_encoding: str, available=COMPRESSORS) -> str:
+    """The best encoding in ``available`` the client accepts, or None for identity."""
+    weights = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if name:
+            weights[name.strip().lower()] = q
+    default = weights.get("*", 0.0)
+    best, best_q = None, 0.0
+    for encoding in PREFERENCE:
+        q = weights.get(encoding, default)
+        if encoding in available and q > best_q:
+            best, best_q = encoding, q
+    return best
+
+def encoded_etag(etag: str, encoding: str) -> str:
+    return etag[:-1] + f'-{encoding}"'
+
+def strip_encoding(etag: str) -> str:
+    for encoding in PREFERENCE:
+        suffix = f'-{encoding}"'
+        if etag.endswith(suffix):
+            return etag[:-len(suffix)] + '"'
+    return etag
+
+class CompressedBodies:
+    """LRU of compressed bodies keyed by (method, path, query string, ETag, encoding), bounded by total size."""
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._bodies = OrderedDict()
+        self._size = 0
+
+    def get(self, key):
+        body = self._bodies.get(key)
+        if body is not None:
+            self._bodies.move_to_end(key)
+        return body
+
+    def put(self, key, body: bytes):
+        if len(body) > self.max_bytes:
+            return
+        previous = self._bodies.pop(key, None)
+        if previous is not None:
+            self._size -= len(previous)
+        self._bodies[key] = body
+        self._size += len(body)
+        while self._size > self.max_bytes:
+            _, evicted = self._bodies.popitem(last=False)
+            self._size -= len(evicted)
+
+class CompressionMiddleware:
+    """Compresses complete (single-message) 200 responses of compressible types."""
+
+    def __init__(self, app, minimum_size: int = 1024, offload_size: int = 64 * 1024, cache: CompressedBodies = None):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.offload_size = offload_size
+        self.cache = cache if cache is not None else CompressedBodies()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        encoding = negotiate(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if_none_match = headers.get(b"if-none-match")
+        if if_none_match is not None:
+            # Validators of compressed representations are checked against the uncompressed ETag
+            tags = [strip_encoding(tag.strip()) for tag in if_none_match.decode("latin-1").split(",")]
+            scope = dict(scope, headers=[
+                (name, value) for name, value in scope["headers"] if name != b"if-none-match"
+            ] + [(b"if-none-match", ", ".join(tags).encode("latin-1"))])
+        target = (scope["method"], scope.get("raw_path") or scope["path"].encode(), scope.get("query_string", b""))
+        start = None
+
+        async def send_compressed(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+                if message["status"] == 304 and encoding is not None and if_none_match is not None:
+                    start = self._echo_validator(message, encoding, if_none_match)
+                if message["status"] != 200:
+                    await send(start)
+                    start = None
+                return
+            if start is None:
+                await send(message)
+                return
+            response_start, start = start, None
+            body = message.get("body", b"")
+            if message.get("more_body", False):
+                # Streaming responses are passed through untouched
+                await send(response_start)
+                await send(message)
+                return
+            await self._send_body(response_start, body, encoding, target, send)
+
+        await self.app(scope, receive, send_compressed)
+
+    def _echo_validator(self, start, encoding: str, if_none_match: bytes):
+        # A 304 repeats the validator the client holds, suffixed if it held the compressed one
+        headers = list(start.get("headers", []))
+        for index, (name, value) in enumerate(headers):
+            if name == b"etag":
+                suffixed = encoded_etag(value.decode("latin-1"), encoding).encode("latin-1")
+                if suffixed in if_none_match:
+                    headers[index] = (name, suffixed)
+        return dict(start, headers=headers)
+
+    async def _send_body(self, start, body: bytes, encoding: str, target: tuple, send):
+        headers = list(start.get("headers", []))
+        names = {name: value for name, value in headers}
+        content_type = names.get(b"content-type", b"").decode("latin-1")
+        if not content_type.startswith(COMPRESSIBLE_TYPES) or b"content-encoding" in names:
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+            return
+        headers = [(name, value) for name, value in headers if name != b"vary"]
+        vary = names.get(b"vary")
+        headers.append((b"vary", vary + b", Accept-Encoding" if vary else b"Accept-Encoding"))
+        if encoding is None or len(body) < self.minimum_size:
+            await send(dict(start, headers=headers))
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        etag = names.get(b"etag")
+        key = target + (etag, encoding)
+        compressed = self.cache.get(key) if etag is not None else None
+        if etag is not None:
+            record_cache("compression", compressed is not None)
+        if compressed is None:
+            compress = COMPRESSORS[encoding]
+            if len(body) >= self.offload_size:
+                compressed = await to_thread.run_sync(compress, body)
+            else:
+                compressed = compress(body)
+            if etag is not None:
+                self.cache.put(key, compressed)
+
+        headers = [(name, value) for name, value in headers if name not in (b"content-length", b"etag")]
+        headers += [(b"content-encoding", encoding.encode()), (b"content-length", str(len(compressed)).encode())]
+        if etag is not None:
+            headers.append((b"etag", encoded_etag(etag.decode("latin-1"), encoding).encode("latin-1")))
+        await send(dict(start, headers=headers))
+        await send({"type": "http.response.body", "body": compressed})
@@ -1,12 +1,13 @@
-from jose import jwt 
 from database import get_db  # Make sure to import your DB session provider
 from app.models import User
 from typing import Union, Any
+from functools import lru_cache
 from datetime import datetime
 from sqlalchemy.orm import Session  
 from pydantic import ValidationError
-from fastapi.responses import JSONResponse
-from .utils import ALGORITHM, JWT_SECRET_KEY
+from app.responses import JSONResponse
+from app.revocation import revocation_list, family_key, role_change_key
+from app.tokens import access_tokens, TokenError, TokenExpired
 from app.schemas import TokenPayload, SystemUser
 from fastapi.security import OAuth2PasswordBearer
 from fastapi import Depends, HTTPException, status
@@ -16,36 +17,63 @@ reuseable_oauth = OAuth2PasswordBearer(
     scheme_name="JWT"
 )
 
-async def get_current_user(token: str = Depends(reuseable_oauth), db: Session = Depends(get_db)):
+BEARER = {"WWW-Authenticate": "Bearer"}
+ADMIN = ("admin",)
+STAFF = ("admin", "staff")
+REGULAR = ("regular",)
+
+class AuthError(Exception):
+    """Raised by auth dependencies; main.py renders it as the usual {"status", "message"} body."""
+
+    def __init__(self, status_code: int, message: str, headers: dict = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.message = message
+        self.headers = headers
+
+    def response(self) -> JSONResponse:
+        return JSONResponse(content={"status": self.status_code, "message": self.message}, status_code=self.status_code, headers=self.headers)
+
+async def auth_error_handler(request, exc: AuthError):
+    return exc.response()
+
+async def get_token_payload(token: str = Depends(reuseable_oauth)) -> TokenPayload:
     try:
-        payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[ALGORITHM])
-        token_data = TokenPayload(**payload)      
-        if datetime.fromtimestamp(token_data.exp) < datetime.now():
-            return JSONResponse(content={"status":status.HTTP_401_UNAUTHORIZED, "message": "Token expired"},
-                status_code=status.HTTP_401_UNAUTHORIZED,                
-                headers={"WWW-Authenticate": "Bearer"})            
-    except (jwt.JWTError, ValidationError):
-        return JSONResponse(content={"status":status.HTTP_403_FORBIDDEN, "message": "Could not validate credentials"},
-            status_code=status.HTTP_403_FORBIDDEN,           
-            headers={"WWW-Authenticate": "Bearer"})
-    user = db.query(User).filter(User.email== token_data.sub).first() 
+        token_data = TokenPayload(**access_tokens.decode(token))
+    except TokenExpired:
+        raise AuthError(status.HTTP_401_UNAUTHORIZED, "Token expired", BEARER)
+    except (TokenError, ValidationError):
+        raise AuthError(status.HTTP_403_FORBIDDEN, "Could not validate credentials", BEARER)
+    if revocation_list.is_revoked(token_data.jti) or (token_data.fam is not None and revocation_list.is_revoked(family_key(token_data.fam))):
+        raise AuthError(status.HTTP_401_UNAUTHORIZED, "Token revoked", BEARER)
+    return token_data
+
+def get_current_user(token_data: TokenPayload = Depends(get_token_payload), db: Session = Depends(get_db)) -> User:
+    user = db.query(User).filter(User.email == token_data.sub).first()
     if user is None:
-        return JSONResponse(content={"status":status.HTTP_404_NOT_FOUND, "message": "User not found"},status_code=status.HTTP_404_NOT_FOUND)    
-      
-    return user  
-
-def is_admin(user: User):
-    if user.role != "admin":
-        return JSONResponse(content={"status":status.HTTP_403_FORBIDDEN, "message": "Admin access required"},       status_code=status.HTTP_403_FORBIDDEN,)
-        
-def is_staff(user: User):
-    if user.role not in ["admin", "staff"]:
-        return JSONResponse(content={"status":status.HTTP_403_FORBIDDEN, "message": "Staff access required"},status_code=status.HTTP_403_FORBIDDEN)
-            
-def is_regular(user: User):
-    if user.role != "regular":
-        return JSONResponse(content={"status":status.HTTP_403_FORBIDDEN, "message": "Regular user access required"},status_code=status.HTTP_403_FORBIDDEN)
-        
-def is_author(user: User):
-    if user.role != "author":
-        return JSONResponse(content={"status":status.HTTP_403_FORBIDDEN, "message": "Author user access required"},status_code=status.HTTP_403_FORBIDDEN)
\ No newline at end of file
+        raise AuthError(status.HTTP_404_NOT_FOUND, "User not found")
+    return user
+
+@lru_cache(maxsize=None)
+def require_role(roles: tuple, message: str, status_code: int = status.HTTP_403_FORBIDDEN):
+    """Dependency returning the current user if their role is in ``roles``, else raising AuthError.
+
+    The token's ``role`` claim is checked first, so most rejected requests never reach
+    the database. The claim is not trusted while the user has a recent role change
+    (see assign-role): the request then falls through to the loaded user's role, which
+    is always checked and also covers tokens without the claim. Built once per distinct
+    rule at import.
+    """
+    allowed = frozenset(roles)
+
+    async def check_token_role(token_data: TokenPayload = Depends(get_token_payload)) -> TokenPayload:
+        if token_data.role is not None and token_data.role not in allowed and not revocation_list.is_revoked(role_change_key(token_data.sub)):
+            raise AuthError(status_code, message)
+        return token_data
+
+    def current_user_with_role(token_data: TokenPayload = Depends(check_token_role), user: User = Depends(get_current_user)) -> User:
+        if user.role not in allowed:
+            raise AuthError(status_code, message)
+        return user
+
+    return current_user_with_role
@@ -0,0 +1,176 @@
+import logging
+from datetime import date, datetime, timedelta
+from sqlalchemy.orm import Session
+from app.buffer import FlushBuffer
+from sqlalchemy import and_, bindparam, desc, func, insert, select, text, update
+from app.models import Loan, Book, User, LOAN_PERIOD_DAYS, LOAN_PARTITION_MONTHS_AHEAD, loan_partitions
+
+loans = Loan.__table__
+logger = logging.getLogger(__name__)
+
+class LoanWriter(FlushBuffer):
+    """Batches borrow/return events into the ``loans`` table.
+
+    A return whose borrow is still buffered is folded into the pending row, so each
+    flush is one multi-row INSERT plus one UPDATE per return of an older open loan.
+    The borrow may still sit in another worker's buffer, in which case the UPDATE
+    matches nothing; such a return is kept for up to ``return_attempts`` flushes.
+    """
+
+    def __init__(self, session_factory=None, max_items: int = 500, max_age: float = 2.0, return_attempts: int = 10):
+        super().__init__(max_items=max_items, max_age=max_age)
+        self.session_factory = session_factory
+        self.return_attempts = return_attempts
+        self._borrows = {}   # (user_id, book_id) -> latest pending row; closed earlier rows keep a borrowed_at-suffixed key
+        self._returns = []
+
+    def record_borrow(self, user_id: int, book_id: int, borrowed_at: datetime):
+        self.add(("borrow", user_id, book_id, borrowed_at))
+
+    def record_return(self, user_id: int, book_id: int, returned_at: datetime):
+        self.add(("return", user_id, book_id, returned_at))
+
+    def _collect(self, item):
+        kind, user_id, book_id, at = item
+        key = (user_id, book_id)
+        if kind == "borrow":
+            pending = self._borrows.pop(key, None)
+            if pending is not None:
+                # An earlier buffered loan of the same book was closed in memory; keep it.
+                self._borrows[(user_id, book_id, pending["borrowed_at"])] = pending
+            self._borrows[key] = {"user_id": user_id, "book_id": book_id, "borrowed_at": at,
+                                  "due_at": at + timedelta(days=LOAN_PERIOD_DAYS), "returned_at": None}
+        elif key in self._borrows and self._borrows[key]["returned_at"] is None:
+            self._borrows[key]["returned_at"] = at
+        else:
+            self._returns.append({"b_user_id": user_id, "b_book_id": book_id, "b_returned_at": at, "attempts": 0})
+
+    def _drain(self):
+        batch = (list(self._borrows.values()), self._returns)
+        self._borrows, self._returns = {}, []
+        return batch
+
+    def _requeue(self, batch):
+        rows, returns = batch
+        for row in rows:
+            self._borrows.setdefault((row["user_id"], row["book_id"], row["borrowed_at"]), row)
+            self._size += 1
+        self._returns.extend(returns)
+        self._size += len(returns)
+
+    def _write(self, batch):
+        rows, returns = batch
+        session_factory = self.session_factory
+        if session_factory is None:
+            from database import SessionLocal as session_factory
+        db = session_factory()
+        unmatched = []
+        try:
+            if rows:
+                db.execute(insert(loans), rows)
+            stmt = (
+                update(loans)
+                .where(and_(loans.c.user_id == bindparam("b_user_id"),
+                            loans.c.book_id == bindparam("b_book_id"),
+                            loans.c.borrowed_at <= bindparam("b_returned_at"),
+                            loans.c.returned_at.is_(None)))
+                .values(returned_at=bindparam("b_returned_at"))
+            )
+            for entry in returns:
+                # One statement per return: an executemany reports only the total rowcount
+                result = db.execute(stmt, {name: entry[name] for name in ("b_user_id", "b_book_id", "b_returned_at")})
+                if result.rowcount == 0:
+                    unmatched.append(entry)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        self._retry_returns(unmatched)
+
+    def _retry_returns(self, unmatched):
+        retry = []
+        for entry in unmatched:
+            if entry["attempts"] + 1 < self.return_attempts:
+                retry.append(dict(entry, attempts=entry["attempts"] + 1))
+            else:
+                logger.warning("LoanWriter dropping return with no open loan: %r", entry)
+        if retry:
+            with self._lock:
+                self._returns.extend(retry)
+                self._size += len(retry)
+
+loan_writer = LoanWriter()
+
+def add_loan_partitions(db: Session, months_ahead: int = LOAN_PARTITION_MONTHS_AHEAD):
+    """Split ``pmax`` so monthly partitions exist ``months_ahead`` months past the newest one (MySQL only)."""
+    if db.get_bind().dialect.name != "mysql":
+        return []
+    existing = db.execute(text(
+        "SELECT PARTITION_NAME FROM information_schema.PARTITIONS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'loans' AND PARTITION_NAME <> 'pmax'"
+    )).scalars().all()
+    today = date.today().replace(day=1)
+    if existing:
+        newest = max(existing)
+        year, month = int(newest[1:5]), int(newest[5:7])
+        start = date(year + month // 12, month % 12 + 1, 1)
+    else:
+        start = today
+    target = today.year * 12 + today.month - 1 + months_ahead
+    months = target - (start.year * 12 + start.month - 1)
+    if months <= 0:
+        return []
+    definitions = loan_partitions(start, months)
+    db.execute(text("ALTER TABLE loans REORGANIZE PARTITION pmax INTO (%s)" % ", ".join(definitions)))
+    return [definition.split()[1] for definition in definitions[:-1]]
+
+def top_books(db: Session, since: datetime, until: datetime = None, limit: int = 10):
+    """Most borrowed books in ``[since, until)``; prunes partitions and scans ``ix_loans_borrowed_at_book_id`` only."""
+    period = [loans.c.borrowed_at >= since]
+    if until is not None:
+        period.append(loans.c.borrowed_at < until)
+    counts = (
+        select(loans.c.book_id, func.count().label("borrow_count"))
+        .where(*period)
+        .group_by(loans.c.book_id)
+        .order_by(desc("borrow_count"))
+        .limit(limit)
+        .subquery()
+    )
+    stmt = (
+        select(counts.c.book_id, Book.title, counts.c.borrow_count)
+        .join(Book, Book.id == counts.c.book_id)
+        .order_by(desc(counts.c.borrow_count))
+    )
+    return db.execute(stmt).mappings().all()
+
+def overdue_loans(db: Session, now: datetime = None, limit: int = 100, offset: int = 0):
+    """Open loans past ``due_at``, oldest first, served from ``ix_loans_returned_at_due_at``."""
+    now = now or datetime.utcnow()
+    stmt = (
+        select(loans.c.user_id, User.username, loans.c.book_id, Book.title,
+               loans.c.borrowed_at, loans.c.due_at)
+        .join(User, User.id == loans.c.user_id)
+        .join(Book, Book.id == loans.c.book_id)
+        .where(loans.c.returned_at.is_(None), loans.c.due_at < now)
+        .order_by(loans.c.due_at)
+        .limit(limit)
+        .offset(offset)
+    )
+    return db.execute(stmt).mappings().all()
+
+def user_loan_history(db: Session, user_id: int, before: datetime = None, limit: int = 50):
+    """A user's loans newest first, keyset-paginated on ``borrowed_at`` via ``ix_loans_user_id_borrowed_at``."""
+    conditions = [loans.c.user_id == user_id]
+    if before is not None:
+        conditions.append(loans.c.borrowed_at < before)
+    stmt = (
+        select(loans.c.book_id, Book.title, loans.c.borrowed_at, loans.c.due_at, loans.c.returned_at)
+        .join(Book, Book.id == loans.c.book_id)
+        .where(*conditions)
+        .order_by(desc(loans.c.borrowed_at))
+        .limit(limit)
+    )
+    return db.execute(stmt).mappings().all()
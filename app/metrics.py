@@ -0,0 +1,336 @@
+"""Prometheus-style metrics that stay correct across uvicorn worker processes.
+
+With ``LMS_METRICS_DIR`` set, every worker writes its samples into its own
+memory-mapped files in that directory (``counter_<pid>.db`` for counters and
+histograms, ``gauge_<pid>.db`` for gauges), so writes never contend across
+processes. ``/metrics`` reads and sums every file, whichever worker answers the
+scrape. Empty the directory before starting the workers. Without the variable,
+values are kept in process memory (single worker / development).
+"""
+import os
+import glob
+import json
+import mmap
+import struct
+import time
+import bisect
+import threading
+
+METRICS_DIR = os.getenv("LMS_METRICS_DIR")
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+class MemoryValues:
+    def __init__(self):
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, key: str, amount: float):
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def set(self, key: str, value: float):
+        self._values[key] = value
+
+    def items(self):
+        with self._lock:
+            return list(self._values.items())
+
+class MmapValues:
+    """Append-only ``key -> float64`` map in a memory-mapped file owned by one process.
+
+    Layout: 4-byte used-length header (+4 pad), then entries of a 4-byte key length,
+    the UTF-8 key padded to 8-byte alignment, and the 8-byte value.
+    """
+
+    _INITIAL_SIZE = 1 << 16
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a+b")
+        if os.fstat(self._file.fileno()).st_size == 0:
+            self._file.truncate(self._INITIAL_SIZE)
+        self._capacity = os.fstat(self._file.fileno()).st_size
+        self._map = mmap.mmap(self._file.fileno(), self._capacity)
+        self._used = struct.unpack_from("i", self._map, 0)[0]
+        if self._used == 0:
+            self._used = 8
+            struct.pack_into("i", self._map, 0, self._used)
+        self._positions = {key: pos for key, _, pos in read_entries(self._map, self._used)}
+
+    def _position(self, key: str) -> int:
+        pos = self._positions.get(key)
+        if pos is None:
+            encoded = key.encode("utf-8")
+            padded = encoded + b" " * (8 - (len(encoded) + 4) % 8)
+            entry = struct.pack(f"i{len(padded)}sd", len(encoded), padded, 0.0)
+            while self._used + len(entry) > self._capacity:
+                self._capacity *= 2
+                self._map.close()
+                self._file.truncate(self._capacity)
+                self._map = mmap.mmap(self._file.fileno(), self._capacity)
+            self._map[self._used:self._used + len(entry)] = entry
+            pos = self._used + 4 + len(padded)
+            self._used += len(entry)
+            # Publish the entry only after it is fully written
+            struct.pack_into("i", self._map, 0, self._used)
+            self._positions[key] = pos
+        return pos
+
+    def inc(self, key: str, amount: float):
+        with self._lock:
+            pos = self._position(key)
+            struct.pack_into("d", self._map, pos, struct.unpack_from("d", self._map, pos)[0] + amount)
+
+    def set(self, key: str, value: float):
+        with self._lock:
+            struct.pack_into("d", self._map, self._position(key), value)
+
+    def items(self):
+        with self._lock:
+            return [(key, value) for key, value, _ in read_entries(self._map, self._used)]
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+def read_entries(data, used: int):
+    pos = 8
+    while pos < used:
+        length = struct.unpack_from("i", data, pos)[0]
+        key = bytes(data[pos + 4:pos + 4 + length]).decode("utf-8")
+        pos += 4 + length + (8 - (length + 4) % 8)
+        yield key, struct.unpack_from("d", data, pos)[0], pos
+        pos += 8
+
+def read_file(path: str):
+    with open(path, "rb") as fh:
+        data = fh.read()
+    if len(data) < 8:
+        return []
+    return [(key, value) for key, value, _ in read_entries(data, struct.unpack_from("i", data, 0)[0])]
+
+class _Stores:
+    """Lazily opens this process's stores, reopening them after a fork (pid change)."""
+
+    def __init__(self):
+        self._pid = None
+        self._lock = threading.Lock()
+        self.counters = self.gauges = None
+
+    def get(self):
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    if METRICS_DIR:
+                        os.makedirs(METRICS_DIR, exist_ok=True)
+                        self.counters = MmapValues(os.path.join(METRICS_DIR, f"counter_{pid}.db"))
+                        self.gauges = MmapValues(os.path.join(METRICS_DIR, f"gauge_{pid}.db"))
+                    else:
+                        self.counters, self.gauges = MemoryValues(), MemoryValues()
+                    self._pid = pid
+        return self
+
+_stores = _Stores()
+REGISTRY = []
+
+def _sample_key(name: str, labels: dict) -> str:
+    return json.dumps([name, labels], sort_keys=True)
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._keys = {}
+        REGISTRY.append(self)
+
+    def _key(self, suffix: str, labels: dict, extra=()) -> str:
+        cache_key = (suffix, tuple(labels.get(name) for name in self.labelnames), extra)
+        key = self._keys.get(cache_key)
+        if key is None:
+            sample_labels = {name: str(labels[name]) for name in self.labelnames}
+            sample_labels.update(extra)
+            key = self._keys[cache_key] = _sample_key(self.name + suffix, sample_labels)
+        return key
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        _stores.get().counters.inc(self._key("_total", labels), amount)
+
+class Gauge(_Metric):
+    """``multiprocess_mode`` is ``livesum`` (summed over live workers) or ``all`` (one series per pid)."""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), multiprocess_mode: str = "livesum"):
+        super().__init__(name, documentation, labelnames)
+        self.multiprocess_mode = multiprocess_mode
+
+    def inc(self, amount: float = 1.0, **labels):
+        _stores.get().gauges.inc(self._key("", labels), amount)
+
+    def dec(self, amount: float = 1.0, **labels):
+        _stores.get().gauges.inc(self._key("", labels), -amount)
+
+    def set(self, value: float, **labels):
+        _stores.get().gauges.set(self._key("", labels), value)
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        # Only the bucket the value falls in is incremented; buckets are made cumulative at scrape time
+        index = bisect.bisect_left(self.buckets, value)
+        bound = str(self.buckets[index]) if index < len(self.buckets) else "+Inf"
+        counters = _stores.get().counters
+        counters.inc(self._key("_bucket", labels, (("le", bound),)), 1.0)
+        counters.inc(self._key("_sum", labels), value)
+        counters.inc(self._key("_count", labels), 1.0)
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def _collect_samples():
+    """``{(name, labels_json): value}`` summed over every worker."""
+    kinds = {metric.name: metric for metric in REGISTRY}
+    samples = {}
+
+    def add(key, value, pid=None):
+        name, labels = json.loads(key)
+        metric = kinds.get(name) or kinds.get(name.rsplit("_", 1)[0])
+        if isinstance(metric, Gauge) and metric.multiprocess_mode == "all" and pid is not None:
+            labels["pid"] = str(pid)
+        sample = (name, json.dumps(labels, sort_keys=True))
+        samples[sample] = samples.get(sample, 0.0) + value
+
+    if METRICS_DIR:
+        for path in glob.glob(os.path.join(METRICS_DIR, "*.db")):
+            kind, pid = os.path.basename(path)[:-3].split("_", 1)
+            if kind == "gauge" and not _pid_alive(int(pid)):
+                continue
+            for key, value in read_file(path):
+                add(key, value, int(pid))
+    else:
+        stores = _stores.get()
+        for key, value in stores.counters.items() + stores.gauges.items():
+            add(key, value)
+    return samples
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    escaped = (f'{name}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"' for name, value in sorted(labels.items()))
+    return "{" + ",".join(escaped) + "}"
+
+def generate_latest() -> str:
+    """Render every registered metric in the Prometheus text exposition format."""
+    samples = _collect_samples()
+    by_name = {}
+    for (name, labels), value in samples.items():
+        by_name.setdefault(name, []).append((json.loads(labels), value))
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        if isinstance(metric, Histogram):
+            lines.extend(_histogram_lines(metric, by_name))
+            continue
+        suffix = "_total" if isinstance(metric, Counter) else ""
+        for labels, value in sorted(by_name.get(metric.name + suffix, []), key=lambda item: sorted(item[0].items())):
+            lines.append(f"{metric.name}{suffix}{_format_labels(labels)} {value:g}")
+    return "\n".join(lines) + "\n"
+
+def _histogram_lines(metric: Histogram, by_name: dict):
+    series = {}
+    for labels, value in by_name.get(metric.name + "_bucket", []):
+        bound = labels.pop("le")
+        series.setdefault(json.dumps(labels, sort_keys=True), {})[bound] = value
+    sums = {json.dumps(labels, sort_keys=True): value for labels, value in by_name.get(metric.name + "_sum", [])}
+    counts = {json.dumps(labels, sort_keys=True): value for labels, value in by_name.get(metric.name + "_count", [])}
+    for labels_json in sorted(series):
+        labels, buckets, cumulative = json.loads(labels_json), series[labels_json], 0.0
+        for bound in [str(b) for b in metric.buckets] + ["+Inf"]:
+            cumulative += buckets.get(bound, 0.0)
+            yield f"{metric.name}_bucket{_format_labels({**labels, 'le': bound})} {cumulative:g}"
+        yield f"{metric.name}_sum{_format_labels(labels)} {sums.get(labels_json, 0.0):g}"
+        yield f"{metric.name}_count{_format_labels(labels)} {counts.get(labels_json, 0.0):g}"
+
+def mark_process_dead(pid: int = None):
+    """Drop this worker's gauges (call on shutdown); its counters keep contributing to totals."""
+    if METRICS_DIR:
+        try:
+            os.remove(os.path.join(METRICS_DIR, f"gauge_{pid or os.getpid()}.db"))
+        except FileNotFoundError:
+            pass
+
+REQUEST_DURATION = Histogram("lms_http_request_duration_seconds", "HTTP request latency by route template.", ("method", "route", "status"))
+REQUESTS_IN_FLIGHT = Gauge("lms_http_requests_in_flight", "HTTP requests currently being served.")
+RESPONSE_SIZE = Histogram("lms_http_response_size_bytes", "HTTP response body size by route template.", ("method", "route"), buckets=SIZE_BUCKETS)
+CACHE_REQUESTS = Counter("lms_cache_requests", "Cache lookups by cache and result (hit/miss).", ("cache", "result"))
+DB_POOL_CHECKED_OUT = Gauge("lms_db_pool_checked_out", "Connections checked out of the pool.", multiprocess_mode="all")
+DB_POOL_SIZE = Gauge("lms_db_pool_size", "Configured pool size.", multiprocess_mode="all")
+DB_POOL_OVERFLOW = Gauge("lms_db_pool_overflow", "Connections open beyond pool_size.", multiprocess_mode="all")
+SINGLEFLIGHT_REQUESTS = Counter("lms_singleflight_requests", "Coalesced reads by group and result (leader/coalesced/timeout).", ("group", "result"))
+BCRYPT_IN_FLIGHT = Gauge("lms_bcrypt_in_flight", "Password hash/verify calls running or waiting.")
+
+def record_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+def record_pool_stats(pool):
+    if hasattr(pool, "checkedout"):
+        DB_POOL_CHECKED_OUT.set(pool.checkedout())
+        DB_POOL_SIZE.set(pool.size())
+        DB_POOL_OVERFLOW.set(max(pool.overflow(), 0))
+
+class MetricsMiddleware:
+    """Records latency, response size and in-flight requests, labelled by the matched route template."""
+
+    def __init__(self, app, pool_interval: float = 1.0):
+        self.app = app
+        self.pool_interval = pool_interval
+        self._pool_checked_at = 0.0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        response = {"status": 500, "size": 0}
+
+        async def send_with_metrics(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                response["size"] += len(message.get("body", b""))
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            # The router stores the matched route in the (shared) scope; unmatched paths share one label
+            route = getattr(scope.get("route"), "path", "unmatched")
+            REQUEST_DURATION.observe(time.perf_counter() - started, method=scope["method"], route=route, status=response["status"])
+            RESPONSE_SIZE.observe(response["size"], method=scope["method"], route=route)
+            if started - self._pool_checked_at >= self.pool_interval:
+                self._pool_checked_at = started
+                import database
+                if database._engine is not None:
+                    record_pool_stats(database._engine.pool)
@@ -1,7 +1,9 @@
 from database import Base
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey,Table,DateTime
+from datetime import date
+from sqlalchemy.dialects import mysql
+from sqlalchemy import Column, Integer, BigInteger, String, Boolean, ForeignKey,Table,DateTime,Index,UniqueConstraint
 
 class User(Base):
     __tablename__ = 'users'
@@ -15,16 +17,22 @@ class User(Base):
     role = Column(String)  
     borrower = relationship("Borrower", back_populates="user", uselist=False)
 
-class Token(Base):
-    __tablename__ = 'tokens'
+class RevokedToken(Base):
+    # Denylist of revoked JWT ids; rows are dropped once the token would have expired anyway
+    __tablename__ = 'revoked_tokens'
 
-    id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey('users.id'))  # Reference to the User model
-    access_token = Column(String, unique=True)
-    token_type = Column(String, default='bearer')
-    user = relationship('User', back_populates="tokens")
+    jti = Column(String(64), primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=True)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    revoked_at = Column(DateTime, nullable=False, server_default=func.now(), index=True)
+
+class CatalogVersionBump(Base):
+    # One row per catalog write; every host replays them into its ETag version table (app/versions.py)
+    __tablename__ = 'catalog_version_bumps'
 
-User.tokens = relationship("Token", back_populates="user")
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    keys = Column(String(512), nullable=False)
+    created_at = Column(DateTime, nullable=False, server_default=func.now(), index=True)
 
 class Author(Base):
     __tablename__ = 'authors'
@@ -39,12 +47,17 @@ class Book(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, index=True)
-    isbn = Column(String, unique=True)
+    isbn = Column(String)
     author_id = Column(Integer, ForeignKey('authors.id'))
     published_date = Column(String)
     available = Column(Boolean, default=False)
     author = relationship("Author", back_populates="books")
     last_borrowed_date = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        UniqueConstraint('isbn', name='uq_books_isbn'),
+        UniqueConstraint('title', 'published_date', name='uq_books_title_published_date'),
+    )
     
 class Borrower(Base):
     __tablename__ = 'borrowers'
@@ -59,3 +72,50 @@ borrowed_books = Table('borrowed_books', Base.metadata, # Many to Many relations
     Column('book_id', Integer, ForeignKey('books.id'), primary_key=True)
 )
 
+LOAN_PERIOD_DAYS = 14
+LOAN_PARTITION_MONTHS_AHEAD = 12
+LoanTimestamp = DateTime().with_variant(mysql.DATETIME(fsp=6), "mysql")
+
+def loan_partitions(start: date, months: int) -> list:
+    """Monthly RANGE COLUMNS partition definitions starting at ``start``, plus a catch-all ``pmax``."""
+    partitions = []
+    year, month = start.year, start.month
+    for _ in range(months):
+        next_year, next_month = (year + 1, 1) if month == 12 else (year, month + 1)
+        partitions.append(f"PARTITION p{year:04d}{month:02d} VALUES LESS THAN ('{next_year:04d}-{next_month:02d}-01')")
+        year, month = next_year, next_month
+    partitions.append("PARTITION pmax VALUES LESS THAN (MAXVALUE)")
+    return partitions
+
+class Loan(Base):
+    """Append-only loan history. A row is written per borrow and closed once by setting ``returned_at``.
+
+    MySQL partitions it by month of ``borrowed_at``; partitioned InnoDB tables cannot carry
+    foreign keys, so ``user_id``/``book_id`` are plain indexed columns and ``borrowed_at`` is
+    part of the primary key.
+    """
+    __tablename__ = 'loans'
+
+    user_id = Column(Integer, primary_key=True, autoincrement=False)
+    book_id = Column(Integer, primary_key=True, autoincrement=False)
+    borrowed_at = Column(LoanTimestamp, primary_key=True)
+    due_at = Column(LoanTimestamp, nullable=False)
+    returned_at = Column(LoanTimestamp, nullable=True)
+
+    __table_args__ = (
+        Index('ix_loans_borrowed_at_book_id', 'borrowed_at', 'book_id'),  # top books over a period
+        Index('ix_loans_user_id_borrowed_at', 'user_id', 'borrowed_at'),  # per-user history
+        Index('ix_loans_returned_at_due_at', 'returned_at', 'due_at'),    # open / overdue loans
+        {
+            'mysql_engine': 'InnoDB',
+            'mysql_partition_by': "RANGE COLUMNS(borrowed_at) (%s)" % ", ".join(
+                loan_partitions(date.today().replace(day=1), LOAN_PARTITION_MONTHS_AHEAD)),
+        },
+    )
+
+class CatalogStat(Base):
+    """Pre-aggregated catalog counters, maintained incrementally by ``app.stats``."""
+    __tablename__ = 'catalog_stats'
+
+    name = Column(String(64), primary_key=True)
+    value = Column(BigInteger, nullable=False, default=0)
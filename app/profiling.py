@@ -0,0 +1,137 @@
+import os
+import json
+import time
+import random
+import logging
+import threading
+from contextvars import ContextVar
+from sqlalchemy import event
+
+slow_query_logger = logging.getLogger("lms.sql.slow")
+
+PROFILING_FILE = os.getenv("LMS_PROFILING_FILE", "/tmp/lms-profiling.json")
+DEFAULT_SETTINGS = {
+    "enabled": os.getenv("LMS_PROFILING", "0") == "1",
+    "slow_query_ms": 100.0,
+    "sample_rate": 0.1,
+}
+
+class RequestProfile:
+    __slots__ = ("statements", "db_time", "slowest_time", "slowest_statement", "serialize_time")
+
+    def __init__(self):
+        self.statements = 0
+        self.db_time = 0.0
+        self.slowest_time = 0.0
+        self.slowest_statement = None
+        self.serialize_time = 0.0
+
+current_profile: ContextVar = ContextVar("lms_request_profile", default=None)
+
+class ProfilingSwitch:
+    """Profiling settings shared by every worker through a small JSON file.
+
+    Workers re-read the file at most once per ``check_interval`` seconds, so
+    toggling it takes effect everywhere without a restart.
+    """
+
+    def __init__(self, path: str = PROFILING_FILE, check_interval: float = 1.0):
+        self.path = path
+        self.check_interval = check_interval
+        self.settings = dict(DEFAULT_SETTINGS)
+        self._checked_at = 0.0
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def current(self) -> dict:
+        now = time.monotonic()
+        if now - self._checked_at >= self.check_interval:
+            with self._lock:
+                if now - self._checked_at >= self.check_interval:
+                    self._checked_at = now
+                    self._reload()
+        return self.settings
+
+    def update(self, **changes) -> dict:
+        settings = {**self.current(), **{k: v for k, v in changes.items() if v is not None}}
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as fh:
+            json.dump(settings, fh)
+        os.replace(tmp_path, self.path)
+        self._checked_at = 0.0
+        return self.current()
+
+    def _reload(self):
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            self.settings, self._mtime = dict(DEFAULT_SETTINGS), None
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            with open(self.path) as fh:
+                self.settings = {**DEFAULT_SETTINGS, **json.load(fh)}
+            self._mtime = mtime
+        except (OSError, ValueError):
+            pass
+
+profiling_switch = ProfilingSwitch()
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if current_profile.get() is not None:
+        context._lms_started = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = current_profile.get()
+    started = getattr(context, "_lms_started", None)
+    if profile is None or started is None:
+        return
+    elapsed = time.perf_counter() - started
+    profile.statements += 1
+    profile.db_time += elapsed
+    if elapsed > profile.slowest_time:
+        profile.slowest_time, profile.slowest_statement = elapsed, statement
+    settings = profiling_switch.settings
+    if elapsed * 1000 >= settings["slow_query_ms"] and random.random() < settings["sample_rate"]:
+        slow_query_logger.warning("slow query %.1fms: %s", elapsed * 1000, " ".join(statement.split()))
+
+def install_sql_profiling(engine):
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+def server_timing(profile: RequestProfile, total: float) -> str:
+    parts = [
+        f'db;dur={profile.db_time * 1000:.2f};desc="{profile.statements} queries"',
+        f"serialize;dur={profile.serialize_time * 1000:.2f}",
+        f"app;dur={total * 1000:.2f}",
+    ]
+    if profile.statements:
+        parts.insert(1, f"db-slowest;dur={profile.slowest_time * 1000:.2f}")
+    return ", ".join(parts)
+
+class SQLProfilingMiddleware:
+    """Attaches a RequestProfile to each HTTP request and reports it as a ``Server-Timing`` header."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not profiling_switch.current()["enabled"]:
+            await self.app(scope, receive, send)
+            return
+        profile = RequestProfile()
+        token = current_profile.set(profile)
+        started = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                header = server_timing(profile, time.perf_counter() - started)
+                message["headers"] = list(message.get("headers", [])) + [(b"server-timing", header.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_profile.reset(token)
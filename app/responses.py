@@ -0,0 +1,15 @@
+import time
+from fastapi.responses import JSONResponse as _JSONResponse
+from app.profiling import current_profile
+
+class JSONResponse(_JSONResponse):
+    """``fastapi.responses.JSONResponse`` that records its render time on the request profile."""
+
+    def render(self, content) -> bytes:
+        profile = current_profile.get()
+        if profile is None:
+            return super().render(content)
+        started = time.perf_counter()
+        body = super().render(content)
+        profile.serialize_time += time.perf_counter() - started
+        return body
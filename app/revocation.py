@@ -0,0 +1,141 @@
+import time
+import hashlib
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
+from app.models import RevokedToken
+
+logger = logging.getLogger(__name__)
+
+def _epoch(value: datetime) -> float:
+    return value.replace(tzinfo=timezone.utc).timestamp()
+
+def family_key(family: str) -> str:
+    # A whole refresh-token family is revoked under one denylist entry
+    return f"fam:{family}"
+
+def role_change_key(subject: str) -> str:
+    # Present while tokens issued before the subject's last role change can exist; their role claim is not trusted
+    return "role:" + hashlib.sha256(subject.encode()).hexdigest()[:40]
+
+class RevocationList:
+    """Revoked JWT ids (``jti`` -> expiry timestamp) held in each worker's memory.
+
+    ``is_revoked`` is a single dict lookup, no query. Revocations are written to
+    ``revoked_tokens`` and every worker's sync thread pulls the rows revoked since
+    its last poll, so a logout reaches all workers within ``sync_interval`` seconds.
+    Entries are dropped, in memory and in the table, once the token has expired.
+    """
+
+    def __init__(self, session_factory=None, sync_interval: float = 1.0, gc_interval: float = 60.0, overlap: float = 5.0):
+        self.session_factory = session_factory
+        self.sync_interval = sync_interval
+        self.gc_interval = gc_interval
+        self.overlap = overlap   # re-read window for rows whose transaction committed late
+        self._revoked = {}
+        self._since = None       # newest revoked_at seen, in the database's clock
+        self._gc_at = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def is_revoked(self, jti: str) -> bool:
+        return jti is not None and jti in self._revoked
+
+    def revoke(self, db: Session, jti: str, exp: int, user_id: int = None):
+        """Persist the revocation, then apply it locally; other workers pick it up on their next sync."""
+        db.add(RevokedToken(jti=jti, user_id=user_id, expires_at=datetime.utcfromtimestamp(exp)))
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()   # already revoked
+        with self._lock:
+            self._revoked[jti] = float(exp)
+
+    def renew(self, db: Session, jti: str, exp: float, user_id: int = None):
+        """Like ``revoke``, but an existing entry gets the new expiry; other workers re-read it on their next sync."""
+        entry = RevokedToken(jti=jti, user_id=user_id, expires_at=datetime.utcfromtimestamp(exp), revoked_at=func.now())
+        try:
+            db.merge(entry)
+            db.commit()
+        except IntegrityError:
+            db.rollback()   # inserted concurrently; now it exists, so this merge updates it
+            db.merge(entry)
+            db.commit()
+        with self._lock:
+            self._revoked[jti] = max(float(exp), self._revoked.get(jti, 0.0))
+
+    def claim(self, db: Session, jti: str, exp: float, user_id: int = None) -> bool:
+        """Revoke ``jti`` unless it already is; False means it was used before, on any worker.
+
+        The single-row INSERT is the claim: the primary key lets exactly one
+        request across all workers win, and the local set only skips the
+        round trip for tokens this worker has seen.
+        """
+        if jti in self._revoked:
+            return False
+        db.add(RevokedToken(jti=jti, user_id=user_id, expires_at=datetime.utcfromtimestamp(exp)))
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            return False
+        finally:
+            with self._lock:
+                self._revoked[jti] = float(exp)
+        return True
+
+    def sync(self):
+        session_factory = self.session_factory
+        if session_factory is None:
+            from database import SessionLocal as session_factory
+        db = session_factory()
+        try:
+            stmt = select(RevokedToken.jti, RevokedToken.expires_at, RevokedToken.revoked_at)
+            if self._since is None:
+                stmt = stmt.where(RevokedToken.expires_at > datetime.utcnow())
+            else:
+                stmt = stmt.where(RevokedToken.revoked_at >= self._since - timedelta(seconds=self.overlap))
+            rows = db.execute(stmt).all()
+            if time.monotonic() - self._gc_at >= self.gc_interval:
+                self._gc_at = time.monotonic()
+                db.execute(delete(RevokedToken).where(RevokedToken.expires_at < datetime.utcnow()))
+                db.commit()
+        finally:
+            db.close()
+        now = time.time()
+        with self._lock:
+            for jti, expires_at, revoked_at in rows:
+                self._revoked[jti] = _epoch(expires_at)
+                if self._since is None or revoked_at > self._since:
+                    self._since = revoked_at
+            if any(exp <= now for exp in self._revoked.values()):
+                self._revoked = {jti: exp for jti, exp in self._revoked.items() if exp > now}
+
+    def start(self):
+        try:
+            self.sync()
+        except Exception:
+            logger.exception("initial revocation list sync failed")
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name=type(self).__name__, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.sync_interval * 2)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.sync_interval):
+            try:
+                self.sync()
+            except Exception:
+                logger.exception("revocation list sync failed")
+
+revocation_list = RevocationList()
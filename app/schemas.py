@@ -26,11 +26,17 @@ class UserAuth(BaseModel):
 
 class TokenSchema(BaseModel):
     access_token: str
-    token_type: str  
+    token_type: str
+
+class RefreshRequest(BaseModel):
+    refresh_token: str  
 
 class TokenPayload(BaseModel): # for decoding the JWT token's payload
     sub: str  # Subject (e.g., user identifier)
     exp: Optional[int]  # Expiration time (optional, if you include exp in the JWT)
+    jti: Optional[str] = None  # Token id, checked against the revocation list
+    role: Optional[str] = None  # Lets role checks reject a request before it touches the DB
+    fam: Optional[str] = None  # Login (refresh token family) the token was issued under
 
 # SystemUser schema (used for system or user-related data)
 class SystemUser(BaseModel):
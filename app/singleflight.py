@@ -0,0 +1,89 @@
+import copy
+import functools
+import threading
+from fastapi import Response
+from app.metrics import SINGLEFLIGHT_REQUESTS
+from app.versions import current_etag
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """Coalesces identical concurrent calls within a worker.
+
+    The first caller for a key (the leader) runs the function; callers arriving
+    while it is in flight wait for and share its result or exception. A caller
+    that waits longer than ``timeout`` seconds runs the function itself.
+    """
+
+    def __init__(self, name: str, timeout: float = 5.0):
+        self.name = name
+        self.timeout = timeout
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if leader:
+            SINGLEFLIGHT_REQUESTS.inc(group=self.name, result="leader")
+            try:
+                call.result = fn()
+                return call.result
+            except BaseException as error:
+                call.error = error
+                raise
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+        if not call.done.wait(self.timeout):
+            SINGLEFLIGHT_REQUESTS.inc(group=self.name, result="timeout")
+            return fn()
+        SINGLEFLIGHT_REQUESTS.inc(group=self.name, result="coalesced")
+        if call.error is not None:
+            # Each waiter raises its own copy: raising the leader's object in several threads would interleave its traceback
+            raise self._copy_error(call.error) from call.error
+        return call.result
+
+    def _copy_error(self, error: BaseException) -> BaseException:
+        try:
+            return copy.copy(error)
+        except Exception:
+            return RuntimeError(f"{self.name}: coalesced call failed: {error!r}")
+
+    def response(self, key, build) -> Response:
+        """Shares the rendered status and body of ``build()`` (a JSONResponse); each caller gets its own Response."""
+        def render():
+            response = build()
+            return response.status_code, response.body
+        status_code, body = self.do(key, render)
+        return Response(content=body, status_code=status_code, media_type="application/json")
+
+    def coalesce(self, *key_params):
+        """Decorator for sync JSON endpoints; requests with equal ``key_params`` values share one execution.
+
+        Under ``versions.conditional`` the ETag is part of the key, so a caller never shares a
+        result rendered from an older catalog version than the ETag it will be sent with.
+        """
+        def decorator(endpoint):
+            @functools.wraps(endpoint)
+            def wrapper(**kwargs):
+                key = (endpoint.__name__, current_etag.get()) + tuple(
+                    tuple(value) if isinstance(value, list) else value
+                    for value in (kwargs[name] for name in key_params)
+                )
+                return self.response(key, lambda: endpoint(**kwargs))
+            return wrapper
+        return decorator
+
+book_reads = SingleFlight("books")
+author_reads = SingleFlight("authors")
@@ -0,0 +1,148 @@
+import time
+from sqlalchemy.orm import Session
+from app.buffer import FlushBuffer
+from sqlalchemy import func, insert, select, update
+from app.loans import loan_writer
+from app.models import Author, Book, CatalogStat, Loan, borrowed_books
+
+catalog_stats_table = CatalogStat.__table__
+
+GLOBAL_STATS = ("books_total", "books_available", "authors_total", "loans_active", "borrows_total", "returns_total")
+AUTHOR_BOOKS_PREFIX = "author_books:"
+REBUILT_AT = "rebuilt_at"   # time of the last recount, in microseconds since the epoch
+
+def now_us() -> int:
+    return time.time_ns() // 1000
+
+def author_books_key(author_id: int) -> str:
+    return f"{AUTHOR_BOOKS_PREFIX}{author_id}"
+
+class StatsAggregator(FlushBuffer):
+    """Accumulates counter deltas in-process and adds them to ``catalog_stats`` on flush.
+
+    Each delta keeps the time it was recorded. A rebuild stores the time of its
+    recount in the ``rebuilt_at`` row, and a flush drops the deltas recorded before
+    it: the recount already includes those writes.
+    """
+
+    def __init__(self, session_factory=None, max_items: int = 1000, max_age: float = 2.0):
+        super().__init__(max_items=max_items, max_age=max_age)
+        self.session_factory = session_factory
+        self._deltas = []   # (recorded_at in microseconds, {name: delta})
+
+    def record(self, deltas: dict):
+        self.add((now_us(), deltas))
+
+    def pending(self, names) -> dict:
+        totals = dict.fromkeys(names, 0)
+        with self._lock:
+            for _, deltas in self._deltas:
+                for name, delta in deltas.items():
+                    if name in totals:
+                        totals[name] += delta
+        return totals
+
+    def pending_with_prefix(self, prefix: str) -> dict:
+        totals = {}
+        with self._lock:
+            for _, deltas in self._deltas:
+                for name, delta in deltas.items():
+                    if name.startswith(prefix):
+                        totals[name] = totals.get(name, 0) + delta
+        return totals
+
+    def _collect(self, item):
+        self._deltas.append(item)
+
+    def _drain(self):
+        batch, self._deltas = self._deltas, []
+        return batch
+
+    def _write(self, batch):
+        session_factory = self.session_factory
+        if session_factory is None:
+            from database import SessionLocal as session_factory
+        db = session_factory()
+        try:
+            # Locked until commit, so a rebuild cannot recount between this read and the updates
+            rebuilt_at = db.scalar(
+                select(catalog_stats_table.c.value).where(catalog_stats_table.c.name == REBUILT_AT).with_for_update()
+            ) or 0
+            totals = {}
+            for recorded_at, deltas in batch:
+                if recorded_at > rebuilt_at:
+                    for name, delta in deltas.items():
+                        totals[name] = totals.get(name, 0) + delta
+            for name, delta in totals.items():
+                if not delta:
+                    continue
+                result = db.execute(
+                    update(catalog_stats_table)
+                    .where(catalog_stats_table.c.name == name)
+                    .values(value=catalog_stats_table.c.value + delta)
+                )
+                if result.rowcount == 0:
+                    db.execute(insert(catalog_stats_table).values(name=name, value=delta))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+catalog_stats = StatsAggregator()
+
+def read_stats(db: Session, names) -> dict:
+    """Current value of each counter: the persisted row plus this worker's unflushed delta."""
+    names = list(names)
+    values = dict(db.execute(
+        select(catalog_stats_table.c.name, catalog_stats_table.c.value).where(catalog_stats_table.c.name.in_(names))
+    ).all())
+    pending = catalog_stats.pending(names)
+    return {name: values.get(name, 0) + pending[name] for name in names}
+
+def read_author_book_counts(db: Session) -> dict:
+    """Books per author from the summary rows, keyed by author id (one range scan on the primary key)."""
+    rows = db.execute(
+        select(catalog_stats_table.c.name, catalog_stats_table.c.value)
+        .where(catalog_stats_table.c.name.startswith(AUTHOR_BOOKS_PREFIX, autoescape=True))
+    ).all()
+    counts = {int(name[len(AUTHOR_BOOKS_PREFIX):]): value for name, value in rows}
+    for name, delta in catalog_stats.pending_with_prefix(AUTHOR_BOOKS_PREFIX).items():
+        author_id = int(name[len(AUTHOR_BOOKS_PREFIX):])
+        counts[author_id] = counts.get(author_id, 0) + delta
+    return {author_id: count for author_id, count in counts.items() if count}
+
+def rebuild_catalog_stats(db: Session):
+    """Recount every counter from the source tables. Run after migrating or to repair drift.
+
+    Safe while workers are running: their unflushed deltas recorded before the recount
+    are dropped at flush (see StatsAggregator), which assumes the hosts' clocks agree.
+    The loan totals miss the borrows and returns still buffered in other workers'
+    LoanWriters, a couple of seconds' worth at most.
+    """
+    catalog_stats.flush()
+    loan_writer.flush()
+    # Taking the rebuilt_at row lock first waits for in-flight flushes and holds off new ones until commit
+    previous = db.scalar(
+        select(catalog_stats_table.c.value).where(catalog_stats_table.c.name == REBUILT_AT).with_for_update()
+    )
+    if previous is None:
+        db.execute(insert(catalog_stats_table).values(name=REBUILT_AT, value=0))
+    rebuilt_at = now_us()
+    values = {
+        "books_total": db.scalar(select(func.count()).select_from(Book)),
+        "books_available": db.scalar(select(func.count()).select_from(Book).where(Book.available.is_(True))),
+        "authors_total": db.scalar(select(func.count()).select_from(Author)),
+        "loans_active": db.scalar(select(func.count()).select_from(borrowed_books)),
+        "borrows_total": db.scalar(select(func.count()).select_from(Loan)),
+        "returns_total": db.scalar(select(func.count()).select_from(Loan).where(Loan.returned_at.isnot(None))),
+    }
+    for author_id, count in db.execute(select(Book.author_id, func.count()).group_by(Book.author_id)).all():
+        if author_id is not None:
+            values[author_books_key(author_id)] = count
+    db.execute(catalog_stats_table.delete())
+    db.execute(insert(catalog_stats_table), [{"name": name, "value": value} for name, value in values.items()]
+               + [{"name": REBUILT_AT, "value": rebuilt_at}])
+    db.commit()
+    return values
@@ -0,0 +1,142 @@
+"""JWT signing behind a small backend interface, with keys loaded once from the environment.
+
+Each token kind reads ``<PREFIX>_ALGORITHM`` (default HS256), ``<PREFIX>_KID`` (default
+``1``), and ``<PREFIX>_SECRET_KEY``: the HMAC secret, or for RS*/ES*/EdDSA a private key
+as PEM text or a path to a PEM file. ``<PREFIX>_PREVIOUS_KEYS`` (``kid=key,...``) lists
+retired secrets or public keys that still verify tokens during a rotation. New tokens
+carry the active ``kid`` header. ``JWT_BACKEND`` picks ``pyjwt`` (default) or ``jose``.
+"""
+import os
+import logging
+from dotenv import load_dotenv
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+class TokenError(Exception):
+    pass
+
+class TokenExpired(TokenError):
+    pass
+
+def _read_key(value: str) -> str:
+    if value.lstrip().startswith("-----BEGIN") or not os.path.isfile(value):
+        return value
+    with open(value) as fh:
+        return fh.read()
+
+class KeySet:
+    """The active signing key plus every key (by ``kid``) accepted for verification."""
+
+    def __init__(self, algorithm: str, kid: str, signing_key: str, previous: dict = None):
+        self.algorithm = algorithm
+        self.kid = kid
+        self.signing_key = signing_key
+        self.symmetric = algorithm.startswith("HS")
+        self.verify_keys = dict(previous or {})
+        self.verify_keys[kid] = signing_key if self.symmetric else self._public_pem(signing_key)
+
+    @staticmethod
+    def _public_pem(private_pem: str) -> str:
+        from cryptography.hazmat.primitives import serialization
+        private_key = serialization.load_pem_private_key(private_pem.encode(), password=None)
+        return private_key.public_key().public_bytes(
+            serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+        ).decode()
+
+    @classmethod
+    def from_env(cls, prefix: str, default_secret: str = None):
+        algorithm = os.getenv(f"{prefix}_ALGORITHM", "HS256")
+        secret = os.getenv(f"{prefix}_SECRET_KEY")
+        if secret is None:
+            if default_secret is None or not algorithm.startswith("HS"):
+                raise RuntimeError(f"{prefix}_SECRET_KEY is not set")
+            logger.warning("%s_SECRET_KEY is not set, using the built-in development secret", prefix)
+            secret = default_secret
+        previous = {}
+        for entry in filter(None, os.getenv(f"{prefix}_PREVIOUS_KEYS", "").split(",")):
+            kid, _, key = entry.partition("=")
+            previous[kid.strip()] = _read_key(key.strip())
+        return cls(algorithm, os.getenv(f"{prefix}_KID", "1"), _read_key(secret), previous)
+
+class TokenBackend:
+    """Encodes/decodes JWTs with a KeySet. Implementations prepare their key objects once."""
+    name = ""
+
+    def __init__(self, keys: KeySet):
+        self.keys = keys
+
+    def encode(self, claims: dict) -> str:
+        raise NotImplementedError
+
+    def decode(self, token: str) -> dict:
+        """Verified claims; raises TokenExpired or TokenError."""
+        raise NotImplementedError
+
+    def _verify_key(self, jwt, token: str):
+        # With a single key there is nothing to look up, so the header is not parsed twice
+        if len(self._verify_keys) == 1:
+            return self._default_key
+        kid = jwt.get_unverified_header(token).get("kid", self.keys.kid)
+        key = self._verify_keys.get(kid)
+        if key is None:
+            raise TokenError(f"unknown key id {kid!r}")
+        return key
+
+class PyJWTBackend(TokenBackend):
+    name = "pyjwt"
+
+    def __init__(self, keys: KeySet):
+        super().__init__(keys)
+        import jwt
+        self._jwt = jwt
+        algorithm = jwt.get_algorithm_by_name(keys.algorithm)
+        # Parsed once here instead of on every encode/decode
+        self._signing_key = algorithm.prepare_key(keys.signing_key)
+        self._verify_keys = {kid: algorithm.prepare_key(key) for kid, key in keys.verify_keys.items()}
+        self._default_key = self._verify_keys[keys.kid]
+        self._headers = {"kid": keys.kid}
+
+    def encode(self, claims: dict) -> str:
+        return self._jwt.encode(claims, self._signing_key, algorithm=self.keys.algorithm, headers=self._headers)
+
+    def decode(self, token: str) -> dict:
+        jwt = self._jwt
+        try:
+            return jwt.decode(token, self._verify_key(jwt, token), algorithms=[self.keys.algorithm])
+        except jwt.ExpiredSignatureError as exc:
+            raise TokenExpired(str(exc)) from exc
+        except jwt.PyJWTError as exc:
+            raise TokenError(str(exc)) from exc
+
+class JoseBackend(TokenBackend):
+    name = "jose"
+
+    def __init__(self, keys: KeySet):
+        super().__init__(keys)
+        from jose import jwk, jwt
+        self._jwt = jwt
+        self._signing_key = jwk.construct(keys.signing_key, keys.algorithm)
+        self._verify_keys = {kid: jwk.construct(key, keys.algorithm) for kid, key in keys.verify_keys.items()}
+        self._default_key = self._verify_keys[keys.kid]
+        self._headers = {"kid": keys.kid}
+
+    def encode(self, claims: dict) -> str:
+        return self._jwt.encode(claims, self._signing_key, algorithm=self.keys.algorithm, headers=self._headers)
+
+    def decode(self, token: str) -> dict:
+        jwt = self._jwt
+        try:
+            return jwt.decode(token, self._verify_key(jwt, token), algorithms=[self.keys.algorithm])
+        except jwt.ExpiredSignatureError as exc:
+            raise TokenExpired(str(exc)) from exc
+        except jwt.JWTError as exc:
+            raise TokenError(str(exc)) from exc
+
+BACKENDS = {backend.name: backend for backend in (PyJWTBackend, JoseBackend)}
+
+def load_backend(keys: KeySet, name: str = None) -> TokenBackend:
+    return BACKENDS[name or os.getenv("JWT_BACKEND", "pyjwt")](keys)
+
+access_tokens = load_backend(KeySet.from_env("JWT", default_secret="your secret key"))
+refresh_tokens = load_backend(KeySet.from_env("JWT_REFRESH", default_secret="your refresh secret key"))
@@ -1,6 +1,8 @@
 import os
-from jose import jwt
+from uuid import uuid4
 from .models import User
+from .metrics import BCRYPT_IN_FLIGHT
+from .tokens import access_tokens, refresh_tokens
 from typing import Union, Any
 from dotenv import load_dotenv
 from passlib.context import CryptContext
@@ -9,36 +11,50 @@ load_dotenv()
 
 ACCESS_TOKEN_EXPIRE_MINUTES = 120
 REFRESH_TOKEN_EXPIRE_MINUTES =12 * 24 *7
-ALGORITHM = "HS256"  
-JWT_SECRET_KEY ='your secret key'   
-JWT_REFRESH_SECRET_KEY = 'your refresh secret key' 
+# Signing keys and the JWT library are configured in app/tokens.py (JWT_SECRET_KEY, JWT_REFRESH_SECRET_KEY, ...)
 
 password_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 def get_hashed_password(password: str) -> str:
-    return password_context.hash(password)
+    BCRYPT_IN_FLIGHT.inc()
+    try:
+        return password_context.hash(password)
+    finally:
+        BCRYPT_IN_FLIGHT.dec()
 
 def verify_password(password: str, hashed_pass: str) -> bool:
-    return password_context.verify(password, hashed_pass)
+    BCRYPT_IN_FLIGHT.inc()
+    try:
+        return password_context.verify(password, hashed_pass)
+    finally:
+        BCRYPT_IN_FLIGHT.dec()
 
-def create_access_token(subject: Union[str, Any], expires_delta: int = None) -> str:
+def create_access_token(subject: Union[str, Any], expires_delta: int = None, role: str = None, family: str = None) -> str:
     if expires_delta is not None:
         expires_delta = datetime.utcnow() + expires_delta
     else:
         expires_delta = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
 
-    to_encode = {"exp": expires_delta, "sub": str(subject)}
-    encoded_jwt = jwt.encode(to_encode, JWT_SECRET_KEY, ALGORITHM)
+    # jti identifies the token for revocation (see app/revocation.py)
+    to_encode = {"exp": expires_delta, "sub": str(subject), "jti": uuid4().hex}
+    if family is not None:
+        to_encode["fam"] = family   # the login it belongs to; revoking the family revokes this token too
+    if role is not None:
+        to_encode["role"] = role
+    encoded_jwt = access_tokens.encode(to_encode)
     return encoded_jwt
 
-def create_refresh_token(subject: Union[str, Any], expires_delta: int = None) -> str:
+def create_refresh_token(subject: Union[str, Any], expires_delta: int = None, family: str = None, role: str = None) -> str:
     if expires_delta is not None:
         expires_delta = datetime.utcnow() + expires_delta
     else:
         expires_delta = datetime.utcnow() + timedelta(minutes=REFRESH_TOKEN_EXPIRE_MINUTES)
 
-    to_encode = {"exp": expires_delta, "sub": str(subject)}
-    encoded_jwt = jwt.encode(to_encode, JWT_REFRESH_SECRET_KEY, ALGORITHM)
+    # fam links every token rotated from the same login, so a replayed one can revoke them all
+    to_encode = {"exp": expires_delta, "sub": str(subject), "jti": uuid4().hex, "fam": family or uuid4().hex}
+    if role is not None:
+        to_encode["role"] = role
+    encoded_jwt = refresh_tokens.encode(to_encode)
     return encoded_jwt
 
 
@@ -0,0 +1,278 @@
+"""Catalog version counters behind the ETags of the book/author GET endpoints.
+
+Mutations bump per-entity (``book:<id>``) and per-collection (``books``) keys
+after they commit. GETs derive a strong ETag from the key versions *before*
+running any query, and answer a matching ``If-None-Match`` with 304 straight away.
+
+The ETag also carries a digest of the endpoint and its parameters, so two URLs
+never share a validator even when they depend on the same keys.
+
+A bump is a row in ``catalog_version_bumps``; a key's version is the id of the
+newest bump row naming it. Each host keeps the versions in a memory-mapped file
+(``LMS_VERSIONS_FILE``) shared by its workers: the bumping worker applies its row
+at once, and every worker's sync thread replays the rows written since its last
+poll, so a write on any host reaches every host within ``sync_interval`` seconds.
+Applying a row takes the max, so replaying it again is harmless. Keys hash into a
+fixed slot table; a collision only costs a spurious miss.
+
+The file header holds a random per-host epoch and the id of the newest reset, both
+part of every ETag. ``reset()`` (``python migrate.py --reset-etags``) writes a
+reset row, invalidating every ETag on every host, e.g. after writing to the
+catalog outside the API. A host whose last sync is older than the retained rows
+draws a new epoch instead of replaying. Do not delete the file while workers run:
+they keep the old mapping. If the file cannot be used, versions are kept in process
+memory, which is only correct with a single worker per host.
+"""
+import os
+import zlib
+import time
+import hashlib
+import mmap
+import struct
+import logging
+import threading
+import functools
+import inspect
+from datetime import datetime, timedelta, timezone
+from contextvars import ContextVar
+from fastapi import Request, Response
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import Session
+from app.metrics import record_cache
+from app.models import CatalogVersionBump
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+VERSIONS_FILE = os.getenv("LMS_VERSIONS_FILE", "/tmp/lms-versions.bin")
+BOOKS = "books"
+AUTHORS = "authors"
+BOOK_AUTHORS = "book-authors"   # bumped by author changes, since book responses embed the author name
+RESET = "*"                     # a bump of every key
+
+def book_key(book_id: int) -> str:
+    return f"book:{book_id}"
+
+def author_key(author_id: int) -> str:
+    return f"author:{author_id}"
+
+def _epoch(value: datetime) -> float:
+    return value.replace(tzinfo=timezone.utc).timestamp()
+
+# The ETag a `conditional` endpoint is answering for; SingleFlight adds it to its key
+current_etag: ContextVar = ContextVar("lms_current_etag", default=None)
+
+class VersionTable:
+    # Header: host epoch, newest reset id, time of the last sync (microseconds, database clock)
+    _HEADER = 24
+
+    def __init__(self, path: str = VERSIONS_FILE, slots: int = 65536, session_factory=None,
+                 sync_interval: float = 1.0, overlap: float = 5.0, retention: float = 86400.0, gc_interval: float = 60.0):
+        self.slots = slots
+        self.session_factory = session_factory
+        self.sync_interval = sync_interval
+        self.overlap = overlap       # re-read window for rows whose transaction committed late
+        self.retention = retention   # bump rows older than this are deleted
+        self.gc_interval = gc_interval
+        self._gc_at = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._fd = None
+        try:
+            self._open(path)
+        except (OSError, ValueError):
+            logger.warning("cannot map %s, ETag versions are per process", path, exc_info=True)
+            self._fd = None
+            self._map = bytearray(self._HEADER + slots * 8)
+            self._initialize()
+
+    def _open(self, path: str):
+        size = self._HEADER + self.slots * 8
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        self._flock(fcntl.LOCK_EX if fcntl else None)
+        try:
+            if os.fstat(self._fd).st_size != size:
+                # First worker on the host (or a resized table): all versions 0
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, size)
+                self._map = mmap.mmap(self._fd, size)
+                self._initialize()
+            else:
+                self._map = mmap.mmap(self._fd, size)
+        finally:
+            self._flock(fcntl.LOCK_UN if fcntl else None)
+
+    def _initialize(self):
+        # A new epoch, so no ETag issued before can match; older bump rows need no replay
+        struct.pack_into("QQQ", self._map, 0, int.from_bytes(os.urandom(8), "little"), 0, int(time.time() * 1e6))
+
+    def _flock(self, operation):
+        if operation is not None and self._fd is not None:
+            fcntl.flock(self._fd, operation)
+
+    @property
+    def epoch(self) -> int:
+        # Read from the mapping on every call, so a reset or resync by any process is seen at once
+        return struct.unpack_from("Q", self._map, 0)[0]
+
+    @property
+    def reset_id(self) -> int:
+        return struct.unpack_from("Q", self._map, 8)[0]
+
+    def _offset(self, key: str) -> int:
+        return self._HEADER + (zlib.crc32(key.encode()) % self.slots) * 8
+
+    def get(self, key: str) -> int:
+        return struct.unpack_from("Q", self._map, self._offset(key))[0]
+
+    def bump(self, db: Session, *keys: str):
+        """Record a write to ``keys``; call after the write commits. Commits ``db``."""
+        row = CatalogVersionBump(keys=" ".join(sorted(set(keys))))
+        db.add(row)
+        try:
+            db.commit()
+        except Exception:
+            db.rollback()
+            # The write itself is committed; other hosts will serve stale ETags for it until a reset
+            logger.exception("cannot record catalog version bump of %s", keys)
+            self._increment(keys)
+            return
+        self._apply([(row.id, row.keys)])
+
+    def reset(self, db: Session):
+        """Invalidate every previously issued ETag, on every host."""
+        self.bump(db, RESET)
+
+    def _increment(self, keys):
+        with self._lock:
+            self._flock(fcntl.LOCK_EX if fcntl else None)
+            try:
+                for offset in {self._offset(key) for key in keys}:
+                    struct.pack_into("Q", self._map, offset, struct.unpack_from("Q", self._map, offset)[0] + 1)
+            finally:
+                self._flock(fcntl.LOCK_UN if fcntl else None)
+
+    def _apply(self, rows, synced_through: int = None):
+        with self._lock:
+            self._flock(fcntl.LOCK_EX if fcntl else None)
+            try:
+                for bump_id, keys in rows:
+                    for key in keys.split(" "):
+                        offset = 8 if key == RESET else self._offset(key)
+                        if struct.unpack_from("Q", self._map, offset)[0] < bump_id:
+                            struct.pack_into("Q", self._map, offset, bump_id)
+                if synced_through is not None and synced_through > struct.unpack_from("Q", self._map, 16)[0]:
+                    struct.pack_into("Q", self._map, 16, synced_through)
+            finally:
+                self._flock(fcntl.LOCK_UN if fcntl else None)
+
+    def sync(self):
+        """Replay the bump rows written since this host's last sync."""
+        session_factory = self.session_factory
+        if session_factory is None:
+            from database import SessionLocal as session_factory
+        since = struct.unpack_from("Q", self._map, 16)[0] / 1e6
+        if since < time.time() - self.retention + self.overlap:
+            # Rows this host never saw may be deleted already: start over with a new epoch
+            with self._lock:
+                self._flock(fcntl.LOCK_EX if fcntl else None)
+                try:
+                    self._initialize()
+                finally:
+                    self._flock(fcntl.LOCK_UN if fcntl else None)
+            since = struct.unpack_from("Q", self._map, 16)[0] / 1e6
+        db = session_factory()
+        try:
+            now = db.scalar(select(func.now()))
+            rows = db.execute(
+                select(CatalogVersionBump.id, CatalogVersionBump.keys)
+                .where(CatalogVersionBump.created_at >= datetime.utcfromtimestamp(since - self.overlap))
+            ).all()
+            if time.monotonic() - self._gc_at >= self.gc_interval:
+                self._gc_at = time.monotonic()
+                db.execute(delete(CatalogVersionBump).where(
+                    CatalogVersionBump.created_at < datetime.utcnow() - timedelta(seconds=self.retention)
+                ))
+                db.commit()
+        finally:
+            db.close()
+        self._apply(rows, int(_epoch(now) * 1e6))
+
+    def start(self):
+        try:
+            self.sync()
+        except Exception:
+            logger.exception("initial catalog version sync failed")
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name=type(self).__name__, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.sync_interval * 2)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.sync_interval):
+            try:
+                self.sync()
+            except Exception:
+                logger.exception("catalog version sync failed")
+
+    def etag(self, *keys: str, variant: str = "") -> str:
+        """Strong ETag from the epoch, the newest reset, the versions of ``keys`` and ``variant`` (which representation)."""
+        versions = "-".join("%x" % self.get(key) for key in keys)
+        digest = hashlib.blake2b(variant.encode(), digest_size=8).hexdigest()
+        return '"%x-%x-%s-%s"' % (self.epoch, self.reset_id, versions, digest)
+
+catalog_versions = VersionTable()
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or any(tag.removeprefix("W/") == etag for tag in candidates)
+
+def etag_variant(endpoint_name: str, params: dict) -> str:
+    """The endpoint plus its parameter values; lists keep their order, since responses follow it."""
+    return repr((endpoint_name, sorted(
+        (name, tuple(value) if isinstance(value, list) else value) for name, value in params.items()
+    )))
+
+def conditional(*key_templates: str, params: tuple = (), versions: VersionTable = None):
+    """Decorator for sync GET endpoints: ETag from the versions of ``key_templates`` (formatted with
+    the endpoint's parameters) and the values of ``params``, 304 on ``If-None-Match`` before the endpoint runs.
+    """
+    def decorator(endpoint):
+        signature = inspect.signature(endpoint)
+        parameters = list(signature.parameters.values())
+        parameters.append(inspect.Parameter("_request", inspect.Parameter.KEYWORD_ONLY, annotation=Request))
+
+        @functools.wraps(endpoint)
+        def wrapper(_request: Request, **kwargs):
+            table = versions or catalog_versions
+            variant = etag_variant(endpoint.__name__, {name: kwargs[name] for name in params})
+            etag = table.etag(*(template.format(**kwargs) for template in key_templates), variant=variant)
+            if etag_matches(_request.headers.get("if-none-match"), etag):
+                record_cache("etag", True)
+                return Response(status_code=304, headers={"etag": etag})
+            record_cache("etag", False)
+            token = current_etag.set(etag)
+            try:
+                response = endpoint(**kwargs)
+            finally:
+                current_etag.reset(token)
+            if response.status_code == 200:
+                response.headers["etag"] = etag
+            return response
+
+        wrapper.__signature__ = signature.replace(parameters=parameters)
+        return wrapper
+    return decorator
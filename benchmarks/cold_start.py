@@ -0,0 +1,61 @@
+"""Cold-start benchmark: time from spawning a uvicorn worker to its first 200 response.
+
+    python -m benchmarks.cold_start --runs 5 --path /api/v1/stats
+
+Each run starts a fresh ``uvicorn main:app`` process and polls ``--path`` until it
+answers 200, so the figure includes interpreter start-up, imports, the lifespan
+and the first DB round trip. The schema is created once up front with migrate.py.
+"""
+import os
+import sys
+import time
+import socket
+import argparse
+import statistics
+import subprocess
+import urllib.error
+import urllib.request
+from benchmarks.common import use_database
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def time_to_first_200(path: str, timeout: float) -> float:
+    port = free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}{path}", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started
+            except (urllib.error.URLError, ConnectionError, socket.timeout):
+                time.sleep(0.005)
+        raise TimeoutError(f"no 200 from {path} within {timeout}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--path", default="/api/v1/stats")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"))
+    args = parser.parse_args()
+
+    use_database(args.database_url)
+    subprocess.run([sys.executable, "migrate.py"], check=True, stdout=subprocess.DEVNULL)
+
+    timings = [time_to_first_200(args.path, args.timeout) for _ in range(args.runs)]
+    print(f"runs={args.runs} path={args.path}")
+    print(f"min={min(timings) * 1000:.0f}ms median={statistics.median(timings) * 1000:.0f}ms max={max(timings) * 1000:.0f}ms")
+
+if __name__ == "__main__":
+    main()
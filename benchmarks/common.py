@@ -0,0 +1,45 @@
+"""Helpers shared by the benchmark scripts.
+
+The scripts run the app in-process against ``DATABASE_URL`` (a throwaway SQLite
+file by default), so they must call ``use_database`` before importing ``main``.
+"""
+import os
+import tempfile
+from contextlib import contextmanager
+
+def use_database(url: str = None) -> str:
+    if url is None:
+        url = "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="lms-bench-"), "bench.db")
+    os.environ["DATABASE_URL"] = url
+    return url
+
+def create_schema():
+    """What ``python migrate.py`` does, for the in-process scripts."""
+    import app.models  # noqa: F401
+    from database import Base, init_engine
+    Base.metadata.create_all(bind=init_engine())
+
+class QueryCounter:
+    """Counts statements sent through an engine while attached."""
+
+    def __init__(self):
+        self.count = 0
+        self.statements = []
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+        self.statements.append(statement)
+
+@contextmanager
+def count_queries(engine):
+    from sqlalchemy import event
+    counter = QueryCounter()
+    event.listen(engine, "before_cursor_execute", counter)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, "before_cursor_execute", counter)
+
+def auth_headers(email: str) -> dict:
+    from app.utils import create_access_token
+    return {"Authorization": "Bearer " + create_access_token(email)}
@@ -0,0 +1,64 @@
+"""Encode/decode throughput of the token backends in app/tokens.py.
+
+    python -m benchmarks.jwt_bench [--seconds 1.0]
+
+Runs HS256 and RS256 with each backend, plus python-jose called the way
+app/utils used to (key passed as a string, parsed on every call).
+"""
+import time
+import argparse
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+def _rsa_private_pem() -> str:
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    return key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()).decode()
+
+class RawJose:
+    """Baseline: python-jose with the key re-parsed on each call."""
+
+    def __init__(self, keys):
+        from jose import jwt
+        self.keys, self._jwt = keys, jwt
+
+    def encode(self, claims):
+        return self._jwt.encode(claims, self.keys.signing_key, self.keys.algorithm)
+
+    def decode(self, token):
+        return self._jwt.decode(token, self.keys.verify_keys[self.keys.kid], algorithms=[self.keys.algorithm])
+
+def rate(fn, seconds: float) -> float:
+    calls, started = 0, time.perf_counter()
+    while True:
+        for _ in range(50):
+            fn()
+        calls += 50
+        elapsed = time.perf_counter() - started
+        if elapsed >= seconds:
+            return calls / elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=1.0, help="time spent per measurement")
+    args = parser.parse_args()
+
+    from app.tokens import KeySet, load_backend
+    keysets = {
+        "HS256": KeySet("HS256", "1", "bench-secret-" + "x" * 32),
+        "RS256": KeySet("RS256", "1", _rsa_private_pem()),
+    }
+    claims = {"exp": datetime.utcnow() + timedelta(minutes=120), "sub": "bench@example.com", "jti": uuid4().hex}
+    print(f"{'algorithm':<10}{'backend':<16}{'encode/s':>12}{'decode/s':>12}")
+    for algorithm, keys in keysets.items():
+        backends = {"pyjwt": load_backend(keys, "pyjwt"), "jose": load_backend(keys, "jose"), "jose (raw key)": RawJose(keys)}
+        for name, backend in backends.items():
+            token = backend.encode(claims)
+            assert backend.decode(token)["sub"] == claims["sub"]
+            encode = rate(lambda: backend.encode(claims), args.seconds)
+            decode = rate(lambda: backend.decode(token), args.seconds)
+            print(f"{algorithm:<10}{name:<16}{encode:>12,.0f}{decode:>12,.0f}")
+
+if __name__ == "__main__":
+    main()
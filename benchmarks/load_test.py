@@ -0,0 +1,185 @@
+"""Load test for every route in routes/users.py, routes/authors.py and routes/books.py.
+
+    python -m benchmarks.load_test --requests 500 --concurrency 32 --save baseline.json
+    python -m benchmarks.load_test --requests 500 --concurrency 32 --compare baseline.json
+
+The app runs in-process behind httpx's ASGI transport against ``DATABASE_URL``
+(a fresh SQLite file by default, seeded by benchmarks.seed), so statements per
+request are counted exactly. ``--base-url`` drives an already running server
+instead; the database must then have been seeded with the same ``--seed-*``
+sizes and query counts are not reported.
+
+Each route is one scenario, run in order so that writes have rows to act on:
+reads, creates, updates, borrow, return, deletes. ``--compare`` exits with
+status 1 when any scenario's p95 or throughput is worse than the baseline by
+more than ``--tolerance``, or when it sends more statements per request.
+"""
+import os
+import json
+import time
+import asyncio
+import argparse
+import statistics
+from benchmarks.common import use_database, create_schema, count_queries, auth_headers
+from benchmarks import seed as seeding
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+def build_scenarios(catalog, requests):
+    """(name, count, build(i) -> (method, url, kwargs), expected statuses, on_response)."""
+    admin = auth_headers(seeding.ADMIN_EMAIL)
+    reader_headers = [auth_headers(seeding.user_email(i)) for i in range(catalog["users"])]
+    books, authors = catalog["books"], catalog["authors"]
+    created_books, created_authors = [], []
+    borrow_count = min(requests, len(books), catalog["users"] * 3)
+    reader = lambda i: reader_headers[i % len(reader_headers)]  # borrow_count keeps this at three loans per user
+
+    def collect(target):
+        def on_response(response):
+            if response.status_code == 201:
+                target.append(response.json()["data"]["id"])
+        return on_response
+
+    return [
+        ("get_authors", requests, lambda i: ("GET", "/api/v1/authors/get-authors", {}), {200}, None),
+        ("get_author", requests, lambda i: ("GET", f"/api/v1/authors/get-authors-byId/{authors[i % len(authors)]}", {}), {200}, None),
+        ("get_books", requests, lambda i: ("GET", "/api/v1/books/get-all-books", {}), {200}, None),
+        ("get_book", requests, lambda i: ("GET", f"/api/v1/books/get-book-ById/{books[i % len(books)]}", {}), {200}, None),
+        ("search_books", requests, lambda i: ("GET", "/api/v1/books/search/", {"params": {"title": f"Book {i % 100}", "available": True}}), {200, 404}, None),
+        ("me", requests, lambda i: ("GET", "/api/v1/users/me", {"headers": reader(i)}), {200}, None),
+        ("signup", requests, lambda i: ("POST", "/api/v1/users/signup", {"json": {"username": f"load-{i}", "password": "load-password", "email": f"load-{i}@example.com"}}), {201}, None),
+        ("login", requests, lambda i: ("POST", "/api/v1/users/login", {"data": {"username": f"bench-user-{i % catalog['users']}", "password": seeding.BENCH_PASSWORD}}), {200}, None),
+        ("create_author", requests, lambda i: ("POST", "/api/v1/authors/create-authors", {"json": {"name": f"Load Author {i}"}, "headers": admin}), {201}, collect(created_authors)),
+        ("create_book", requests, lambda i: ("POST", "/api/v1/books/create-books", {"json": {"title": f"Load Book {i}", "isbn": f"{9780000000000 + i}", "author_id": authors[i % len(authors)], "published_date": "2024-01-01"}, "headers": admin}), {201}, collect(created_books)),
+        ("update_author", requests, lambda i: ("PUT", f"/api/v1/authors/update-authors/{authors[i % len(authors)]}", {"json": {"bio": f"bio {i}"}, "headers": admin}), {200}, None),
+        ("update_book", requests, lambda i: ("PUT", f"/api/v1/books/update-book/{books[i % len(books)]}", {"json": {"title": f"Bench Book {books[i % len(books)]} v{i}"}, "headers": admin}), {200}, None),
+        ("assign_role", requests, lambda i: ("POST", "/api/v1/users/assign-role", {"json": {"user_id": 2 + i % catalog["users"], "role": "regular"}, "headers": admin}), {200}, None),
+        ("borrow_book", borrow_count, lambda i: ("POST", f"/api/v1/books/borrow-book/{books[i]}", {"headers": reader(i)}), {200}, None),
+        ("return_book", borrow_count, lambda i: ("POST", f"/api/v1/books/return-book/{books[i]}", {"headers": reader(i)}), {200}, None),
+        ("delete_book", lambda: len(created_books), lambda i: ("DELETE", f"/api/v1/books/delete-book/{created_books[i]}", {"headers": admin}), {200}, None),
+        ("delete_author", lambda: len(created_authors), lambda i: ("DELETE", f"/api/v1/authors/delete-authors/{created_authors[i]}", {"headers": admin}), {200}, None),
+    ]
+
+async def run_scenario(client, count, build, expected, on_response, concurrency):
+    latencies, unexpected = [], 0
+    pending = iter(range(count))
+
+    async def worker():
+        nonlocal unexpected
+        for i in pending:
+            method, url, kwargs = build(i)
+            started = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code not in expected:
+                unexpected += 1
+            elif on_response is not None:
+                on_response(response)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, unexpected, time.perf_counter() - started
+
+async def run(args):
+    import httpx
+    catalog = {"authors": list(range(1, args.seed_authors + 1)), "books": list(range(1, args.seed_books + 1)), "users": args.seed_users}
+    engine, lifespan = None, None
+    if args.base_url:
+        client = httpx.AsyncClient(base_url=args.base_url, timeout=60)
+    else:
+        use_database(os.getenv("DATABASE_URL"))
+        create_schema()
+        catalog = seeding.seed(args.seed_authors, args.seed_books, args.seed_users, args.seed_loans)
+        import main as lms
+        from database import init_engine
+        engine = init_engine()
+        lifespan = lms.app.router.lifespan_context(lms.app)
+        await lifespan.__aenter__()
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=lms.app), base_url="http://bench", timeout=60)
+
+    results = {}
+    try:
+        for name, count, build, expected, on_response in build_scenarios(catalog, args.requests):
+            if args.only and name not in args.only:
+                continue
+            count = count() if callable(count) else count
+            if not count:
+                continue
+            if engine is not None:
+                with count_queries(engine) as counter:
+                    latencies, unexpected, elapsed = await run_scenario(client, count, build, expected, on_response, args.concurrency)
+                queries = round(counter.count / count, 2)
+            else:
+                latencies, unexpected, elapsed = await run_scenario(client, count, build, expected, on_response, args.concurrency)
+                queries = None
+            results[name] = {
+                "requests": count,
+                "unexpected": unexpected,
+                "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+                "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+                "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+                "mean_ms": round(statistics.fmean(latencies) * 1000, 2),
+                "rps": round(count / elapsed, 1),
+                "queries_per_request": queries,
+            }
+    finally:
+        await client.aclose()
+        if lifespan is not None:
+            await lifespan.__aexit__(None, None, None)
+    return results
+
+def print_results(results):
+    print(f"{'scenario':<15}{'n':>6}{'bad':>5}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>9}{'q/req':>7}")
+    for name, r in results.items():
+        queries = "-" if r["queries_per_request"] is None else f"{r['queries_per_request']:g}"
+        print(f"{name:<15}{r['requests']:>6}{r['unexpected']:>5}{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}{r['p99_ms']:>9.2f}{r['rps']:>9.1f}{queries:>7}")
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        if current["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {previous['p95_ms']}ms -> {current['p95_ms']}ms")
+        if current["rps"] < previous["rps"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {previous['rps']} -> {current['rps']} req/s")
+        if None not in (current["queries_per_request"], previous["queries_per_request"]) and current["queries_per_request"] > previous["queries_per_request"]:
+            regressions.append(f"{name}: queries/request {previous['queries_per_request']} -> {current['queries_per_request']}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the LMS API.")
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--only", nargs="*", help="run only these scenarios")
+    parser.add_argument("--base-url", help="drive a running server instead of the in-process app")
+    parser.add_argument("--seed-authors", type=int, default=50)
+    parser.add_argument("--seed-books", type=int, default=1000)
+    parser.add_argument("--seed-users", type=int, default=100)
+    parser.add_argument("--seed-loans", type=int, default=5000)
+    parser.add_argument("--save", help="write results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative slowdown before failing")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    print_results(results)
+    if args.save:
+        with open(args.save, "w") as fh:
+            json.dump(results, fh, indent=2)
+    if args.compare:
+        with open(args.compare) as fh:
+            regressions = compare(results, json.load(fh), args.tolerance)
+        for line in regressions:
+            print("REGRESSION " + line)
+        if regressions:
+            raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""Per-endpoint SQL statement counts for the write paths.
+
+    python -m benchmarks.query_counts
+
+Creates a throwaway SQLite catalog (or uses ``DATABASE_URL``), calls each write
+endpoint once and prints how many statements it sent, including COMMIT-time
+flushes but not the COMMIT itself.
+"""
+from benchmarks.common import use_database, create_schema, count_queries, auth_headers
+
+def main():
+    use_database()
+    create_schema()
+    from fastapi.testclient import TestClient
+    import main as lms
+    from database import SessionLocal, engine
+    from app.models import User, Author
+    from app.utils import get_hashed_password
+
+    db = SessionLocal()
+    db.add_all([
+        User(username="qc-admin", email="qc-admin@example.com", hashed_password=get_hashed_password("secret"), role="admin", is_active=True),
+        User(username="qc-reader", email="qc-reader@example.com", hashed_password=get_hashed_password("secret"), role="regular", is_active=True),
+        Author(name="QC Author", bio="seed"),
+        Author(name="QC Second Author", bio="seed"),
+    ])
+    db.commit()
+    db.close()
+
+    admin, reader = auth_headers("qc-admin@example.com"), auth_headers("qc-reader@example.com")
+    calls = [
+        ("create_user", "post", "/api/v1/users/signup", {"json": {"username": "qc-new", "password": "secret", "email": "qc-new@example.com"}}),
+        ("create_author", "post", "/api/v1/authors/create-authors", {"json": {"name": "QC Third Author"}, "headers": admin}),
+        ("update_author", "put", "/api/v1/authors/update-authors/1", {"json": {"bio": "updated"}, "headers": admin}),
+        ("create_book", "post", "/api/v1/books/create-books", {"json": {"title": "QC Book", "isbn": "9780000000001", "author_id": 1, "published_date": "2024-01-01"}, "headers": admin}),
+        ("update_book", "put", "/api/v1/books/update-book/1", {"json": {"title": "QC Book 2", "author_id": 2}, "headers": admin}),
+        ("assign_role", "post", "/api/v1/users/assign-role", {"json": {"user_id": 3, "role": "staff"}, "headers": admin}),
+    ]
+    print(f"{'endpoint':<16}{'status':>8}{'queries':>9}")
+    with TestClient(lms.app) as client:
+        for name, method, url, kwargs in calls:
+            with count_queries(engine) as counter:
+                response = getattr(client, method)(url, **kwargs)
+            print(f"{name:<16}{response.status_code:>8}{counter.count:>9}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Seed a benchmark catalog.
+
+    DATABASE_URL=mysql+pymysql://... python -m benchmarks.seed --authors 200 --books 5000 --users 500 --loans 20000
+
+Without ``DATABASE_URL`` a throwaway SQLite file is created. Rows are written with
+multi-row INSERTs; every user shares one bcrypt hash (password ``bench-password``)
+so seeding does not spend minutes hashing.
+"""
+import os
+import random
+import argparse
+from datetime import datetime, timedelta
+from benchmarks.common import use_database, create_schema
+
+BENCH_PASSWORD = "bench-password"
+ADMIN_EMAIL = "bench-admin@example.com"
+
+def user_email(index: int) -> str:
+    return f"bench-user-{index}@example.com"
+
+def seed(authors: int = 50, books: int = 1000, users: int = 100, loans: int = 5000, seed_value: int = 42, chunk: int = 1000) -> dict:
+    from sqlalchemy import insert
+    from database import SessionLocal, init_engine
+    from app.utils import get_hashed_password
+    from app.models import Author, Book, Borrower, User, Loan, LOAN_PERIOD_DAYS
+    from app.stats import rebuild_catalog_stats
+
+    rng = random.Random(seed_value)
+    init_engine()
+    db = SessionLocal()
+
+    def insert_chunks(table, rows):
+        for start in range(0, len(rows), chunk):
+            db.execute(insert(table), rows[start:start + chunk])
+
+    try:
+        hashed = get_hashed_password(BENCH_PASSWORD)
+        insert_chunks(User.__table__, [
+            {"username": "bench-admin", "email": ADMIN_EMAIL, "hashed_password": hashed, "full_name": "Bench Admin", "is_active": True, "role": "admin"}
+        ] + [
+            {"username": f"bench-user-{i}", "email": user_email(i), "hashed_password": hashed, "full_name": None, "is_active": True, "role": "regular"}
+            for i in range(users)
+        ])
+        insert_chunks(Author.__table__, [{"name": f"Bench Author {i}", "bio": "seeded"} for i in range(authors)])
+        author_ids = [row[0] for row in db.query(Author.id).order_by(Author.id).all()]
+        insert_chunks(Book.__table__, [
+            {"title": f"Bench Book {i}", "isbn": f"{9790000000000 + i}", "author_id": rng.choice(author_ids),
+             "published_date": f"{rng.randint(1950, 2024)}-01-01", "available": True}
+            for i in range(books)
+        ])
+        book_ids = [row[0] for row in db.query(Book.id).all()]
+        user_ids = [row[0] for row in db.query(User.id).filter(User.role == "regular").all()]
+        insert_chunks(Borrower.__table__, [{"user_id": user_id} for user_id in user_ids])
+
+        # Closed historical loans; the live borrow/return state is left to the load test
+        now = datetime.utcnow()
+        loan_keys, loan_rows = set(), []
+        while len(loan_rows) < loans and user_ids and book_ids:
+            borrowed_at = now - timedelta(days=rng.randint(30, 720), seconds=rng.randint(0, 86399), microseconds=rng.randint(0, 999999))
+            key = (rng.choice(user_ids), rng.choice(book_ids), borrowed_at)
+            if key in loan_keys:
+                continue
+            loan_keys.add(key)
+            loan_rows.append({"user_id": key[0], "book_id": key[1], "borrowed_at": borrowed_at,
+                              "due_at": borrowed_at + timedelta(days=LOAN_PERIOD_DAYS),
+                              "returned_at": borrowed_at + timedelta(days=rng.randint(1, 30))})
+        insert_chunks(Loan.__table__, loan_rows)
+        db.commit()
+        rebuild_catalog_stats(db)
+    finally:
+        db.close()
+    return {"authors": author_ids, "books": book_ids, "users": users}
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed a benchmark catalog.")
+    parser.add_argument("--authors", type=int, default=50)
+    parser.add_argument("--books", type=int, default=1000)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--loans", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    print("DATABASE_URL=" + use_database(os.getenv("DATABASE_URL")))
+    create_schema()
+    seed(args.authors, args.books, args.users, args.loans, args.seed)
+    print(f"Seeded {args.authors} authors, {args.books} books, {args.users} users, {args.loans} loans.")
+
+if __name__ == "__main__":
+    main()
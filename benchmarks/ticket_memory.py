@@ -0,0 +1,89 @@
+"""Peak memory of the ticket relation maps: RowMapping lists vs compact records.
+
+    python -m benchmarks.ticket_memory [--tickets 10000] [--assignees 3] [--attachments 2]
+
+Fills in-memory SQLite tables shaped like the assignee and attachment queries of
+rawsqlalchmeycore.get_related_data, then groups one page of results both ways
+under tracemalloc: the old loop keeping every ``RowMapping``, and
+``ticket_records.group_rows``.
+"""
+import gc
+import time
+import argparse
+import tracemalloc
+from sqlalchemy import Column, Integer, MetaData, String, Table, and_, create_engine, insert, select
+
+metadata = MetaData()
+users = Table("users", metadata, Column("id", Integer, primary_key=True), Column("name", String(100)), Column("email", String(100)), Column("picture", String(255)))
+ticket_assignees = Table("ticket_assignees", metadata, Column("id", Integer, primary_key=True), Column("ticket_id", Integer, index=True), Column("assignee_type", String(20)), Column("assignee_id", Integer))
+ticket_attachments = Table("ticket_attachments", metadata, Column("id", Integer, primary_key=True), Column("ticket_id", Integer, index=True), Column("file_url", String(255)), Column("uploaded_by", Integer))
+
+assignees_stmt = select(
+    ticket_assignees.c.ticket_id, ticket_assignees.c.assignee_type, ticket_assignees.c.assignee_id,
+    users.c.name.label("user_name"), users.c.email.label("user_email"), users.c.picture.label("user_picture"),
+).select_from(ticket_assignees.outerjoin(users, and_(ticket_assignees.c.assignee_type == "user", users.c.id == ticket_assignees.c.assignee_id)))
+attachments_stmt = select(ticket_attachments.c.ticket_id, ticket_attachments.c.id, ticket_attachments.c.file_url, ticket_attachments.c.uploaded_by)
+
+def seed(engine, tickets: int, assignees: int, attachments: int):
+    with engine.begin() as conn:
+        conn.execute(insert(users), [{"id": i, "name": f"Agent {i}", "email": f"agent{i}@example.com", "picture": f"https://cdn.example.com/u/{i}.png"} for i in range(1, 501)])
+        conn.execute(insert(ticket_assignees), [
+            {"ticket_id": t, "assignee_type": "user" if n else "team", "assignee_id": (t * 7 + n) % 500 + 1}
+            for t in range(1, tickets + 1) for n in range(assignees)
+        ])
+        conn.execute(insert(ticket_attachments), [
+            {"ticket_id": t, "file_url": f"https://cdn.example.com/t/{t}/{n}.pdf", "uploaded_by": t % 500 + 1}
+            for t in range(1, tickets + 1) for n in range(attachments)
+        ])
+
+def group_mappings(result) -> dict:
+    """The previous grouping: every RowMapping kept in a per-ticket list."""
+    groups = {}
+    for row in result.mappings():
+        ticket_id = row["ticket_id"]
+        if ticket_id not in groups:
+            groups[ticket_id] = []
+        groups[ticket_id].append(row)
+    return groups
+
+def group_records(result, record) -> dict:
+    from ticket_records import group_rows
+    return group_rows(result, record)
+
+def measure(conn, build):
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    relations = build(conn)
+    elapsed = time.perf_counter() - started
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del relations
+    return current, peak, elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tickets", type=int, default=10000)
+    parser.add_argument("--assignees", type=int, default=3, help="assignee rows per ticket")
+    parser.add_argument("--attachments", type=int, default=2, help="attachment rows per ticket")
+    args = parser.parse_args()
+
+    from ticket_records import AssigneeRecord, AttachmentRecord
+    engine = create_engine("sqlite://")
+    metadata.create_all(engine)
+    seed(engine, args.tickets, args.assignees, args.attachments)
+
+    variants = {
+        "RowMapping lists": lambda conn: (group_mappings(conn.execute(assignees_stmt)), group_mappings(conn.execute(attachments_stmt))),
+        "__slots__ records": lambda conn: (group_records(conn.execute(assignees_stmt), AssigneeRecord), group_records(conn.execute(attachments_stmt), AttachmentRecord)),
+    }
+    rows = args.tickets * (args.assignees + args.attachments)
+    print(f"{args.tickets:,} tickets, {rows:,} related rows")
+    print(f"{'variant':<20}{'retained MB':>13}{'peak MB':>10}{'seconds':>9}")
+    with engine.connect() as conn:
+        for name, build in variants.items():
+            current, peak, elapsed = measure(conn, build)
+            print(f"{name:<20}{current / 2**20:>13.1f}{peak / 2**20:>10.1f}{elapsed:>9.2f}")
+
+if __name__ == "__main__":
+    main()
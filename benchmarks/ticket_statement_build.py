@@ -0,0 +1,100 @@
+"""Python-side cost of preparing the get_main_ticket_data statement, per request.
+
+    python -m benchmarks.ticket_statement_build [--seconds 1.0] [--dialect mysql]
+
+Compares rebuilding the 13-join select on every call (``main_ticket_select()``,
+as before) with reusing ``MAIN_TICKET_SELECT``. Both include the search filters
+and SQLAlchemy's cache-key generation, which every execute pays. The compile
+column is what a compiled-cache miss adds on top. When the ticket ``models``
+package is not importable, rawsqlalchmeycore is loaded against stand-in models
+defined here, with the tables and columns the ticket queries use.
+"""
+import sys
+import time
+import types
+import argparse
+from benchmarks.jwt_bench import rate
+
+def standin_models() -> types.ModuleType:
+    """A ``models`` module with mapped stand-ins for every table rawsqlalchmeycore reads."""
+    from sqlalchemy import Boolean, Column, DateTime, Integer, String, Text, Time
+    from sqlalchemy.orm import declarative_base
+
+    module = types.ModuleType("models")
+    Base = declarative_base()
+
+    def model(_class_name, _table, **columns):
+        # Underscored so a column may be called "name"
+        columns.setdefault("id", Column(Integer, primary_key=True))
+        setattr(module, _class_name, type(_class_name, (Base,), dict(__tablename__=_table, **columns)))
+
+    ticket_ints = ("parent_id", "notification_type_id", "contact_id", "assigned_to_id", "created_by_id", "assigned_by_id",
+                   "company_department_id", "ticket_status_id", "priority_id", "ticket_source_id", "purpose_type_id",
+                   "SLA", "is_deleted", "reminder_flag", "auto_reminder", "reminder_time", "replies_count")
+    ticket_strings = ("ticket_id", "title", "requested_email", "contact_name", "contact_phone_no", "contact_ref_no",
+                      "to_recipients", "cc_recipients", "tags")
+    model("Tickets", "tickets", message=Column(Text), meta_data=Column(Text),
+          response_time=Column(Time), resolution_time=Column(Time),
+          **{name: Column(Integer) for name in ticket_ints}, **{name: Column(String(255)) for name in ticket_strings},
+          **{name: Column(DateTime) for name in ("reminder_datetime", "schedule_at", "created_at", "updated_at")})
+    model("TicketAssignee", "ticket_assignees", ticket_id=Column(Integer), assignee_type=Column(String(20)), assignee_id=Column(Integer))
+    model("User", "users", name=Column(String(100)), email=Column(String(100)), picture=Column(String(255)),
+          company_department_id=Column(Integer), company_id=Column(Integer))
+    model("Contact", "contacts", name=Column(String(100)), picture_url=Column(String(255)), contact_type_id=Column(Integer),
+          segmentations_id=Column(Integer), preferred_phone=Column(String(32)))
+    model("Priority", "priorities", name=Column(String(50)))
+    model("TicketStatusByDept", "ticket_statuses_by_dept", slug=Column(String(50)))
+    model("CompanyDepartment", "company_departments", label=Column(String(100)), department_id=Column(Integer))
+    model("Department", "departments", name=Column(String(100)))
+    model("TicketSource", "ticket_sources", name=Column(String(50)))
+    model("Purpose", "purposes", name=Column(String(100)), label=Column(String(100)), parent_id=Column(Integer), status=Column(Integer))
+    model("SlaConfiguration", "sla_configurations", name=Column(String(100)), response_time=Column(Integer), resolution_time=Column(Integer))
+    model("ContactsPhoneNumber", "contacts_phone_numbers", contact_id=Column(Integer), phone_number=Column(String(32)), is_preferred=Column(Boolean))
+    model("TicketAttachment", "ticket_attachments", ticket_id=Column(Integer), file_url=Column(String(255)), uploaded_by=Column(Integer))
+    model("TicketReplies", "ticket_replies", ticket_id=Column(Integer))
+    model("NotificationType", "notification_types", name=Column(String(50)))
+    model("TeamUser", "team_users", team_id=Column(Integer), user_id=Column(Integer))
+    module.Base = Base
+    module.__all__ = [name for name in vars(module) if name[0].isupper() and name != "Base"]
+    return module
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=1.0, help="time spent per measurement")
+    parser.add_argument("--dialect", default="mysql", choices=["mysql", "sqlite", "postgresql"])
+    args = parser.parse_args()
+
+    from sqlalchemy.dialects import mysql, postgresql, sqlite
+    try:
+        import models  # noqa: F401
+    except ImportError:
+        sys.modules["models"] = standin_models()
+        print("ticket models not importable, using the stand-in tables")
+    import rawsqlalchmeycore as tickets
+    dialect = {"mysql": mysql, "sqlite": sqlite, "postgresql": postgresql}[args.dialect].dialect()
+
+    variants = {
+        "scope only": lambda n: {"accessible_ticket_ids": list(range(n * 100))},
+        "status + priority": lambda n: {"accessible_ticket_ids": list(range(n * 100)), "status_id": n, "priority_id": n + 1},
+        "title + dates": lambda n: {"accessible_ticket_ids": list(range(n * 100)), "title": f"printer {n}", "from_date": "2024-01-01", "to_date": "2024-12-31"},
+    }
+
+    def rebuilt(filters):
+        stmt = tickets.main_ticket_select().where(tickets.build_search_filters(**filters))
+        return stmt._generate_cache_key()
+
+    def reused(filters):
+        return tickets.build_main_ticket_query(tickets.build_search_filters(**filters))._generate_cache_key()
+
+    print(f"{'filters':<20}{'rebuilt/s':>12}{'reused/s':>12}{'compile ms':>12}{'same key':>10}")
+    for name, make_filters in variants.items():
+        first, second = make_filters(1), make_filters(2)
+        same_key = reused(first).key == reused(second).key
+        stmt = tickets.build_main_ticket_query(tickets.build_search_filters(**first))
+        started = time.perf_counter()
+        stmt.compile(dialect=dialect)
+        compile_ms = (time.perf_counter() - started) * 1000
+        print(f"{name:<20}{rate(lambda: rebuilt(first), args.seconds):>12,.0f}{rate(lambda: reused(first), args.seconds):>12,.0f}{compile_ms:>12.2f}{str(same_key):>10}")
+
+if __name__ == "__main__":
+    main()
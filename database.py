@@ -1,42 +1,100 @@
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from config.settings import settings
 from sqlalchemy.pool import QueuePool
-from pymongo import MongoClient
 import urllib.parse
+import threading
+import os
 
-# Read DB settings for live production
-DB_CONNECTION = settings.DB_CONNECTION.strip()  # Remove extra whitespace
-DB_USERNAME = settings.DB_USERNAME
-DB_PASSWORD = settings.DB_PASSWORD
-DB_HOST = settings.DB_HOST
-DB_PORT = str(settings.DB_PORT)  # Ensure it's a string
-DB_DATABASE = settings.DB_DATABASE
-
-# Build connection string
-if DB_PASSWORD:
-    encoded_password = urllib.parse.quote_plus(DB_PASSWORD)
-    DATABASE_URL = f"{DB_CONNECTION}+mysqldb://{DB_USERNAME}:{encoded_password}@{DB_HOST}:{DB_PORT}/{DB_DATABASE}"
-else:
-    DATABASE_URL = f"{DB_CONNECTION}+pymysql://{DB_USERNAME}@{DB_HOST}:{DB_PORT}/{DB_DATABASE}"
-
-# Set up SQLAlchemy
-engine = create_engine(
-    DATABASE_URL,
-    poolclass=QueuePool,
-    pool_size=40,
-    max_overflow=60,
-    pool_timeout=10,
-    pool_recycle=3600,
-    pool_pre_ping=False,
-    echo_pool=False
-)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+_engine = None
+_engine_lock = threading.Lock()
+
+def database_url() -> str:
+    # DATABASE_URL overrides the settings (e.g. sqlite:///bench.db for benchmarks)
+    url = os.getenv("DATABASE_URL")
+    if url:
+        return url
+    from config.settings import settings
+
+    # Read DB settings for live production
+    DB_CONNECTION = settings.DB_CONNECTION.strip()  # Remove extra whitespace
+    DB_USERNAME = settings.DB_USERNAME
+    DB_PASSWORD = settings.DB_PASSWORD
+    DB_HOST = settings.DB_HOST
+    DB_PORT = str(settings.DB_PORT)  # Ensure it's a string
+    DB_DATABASE = settings.DB_DATABASE
+
+    # Build connection string
+    if DB_PASSWORD:
+        encoded_password = urllib.parse.quote_plus(DB_PASSWORD)
+        return f"{DB_CONNECTION}+mysqldb://{DB_USERNAME}:{encoded_password}@{DB_HOST}:{DB_PORT}/{DB_DATABASE}"
+    return f"{DB_CONNECTION}+pymysql://{DB_USERNAME}@{DB_HOST}:{DB_PORT}/{DB_DATABASE}"
+
+# Objects keep their loaded/assigned state after commit, so responses are built without a refresh SELECT.
+# Bound to the engine by init_engine() (called from the FastAPI lifespan or a CLI entry point).
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
-def get_db():    
-    db = SessionLocal()    
+def init_engine():
+    """Create the engine on first use and bind SessionLocal to it. Nothing here connects to the DB."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                url = database_url()
+                _engine = create_engine(
+                    url,
+                    poolclass=QueuePool,
+                    pool_size=40,
+                    max_overflow=60,
+                    pool_timeout=10,
+                    pool_recycle=3600,
+                    pool_pre_ping=False,
+                    echo_pool=False,
+                    connect_args={"check_same_thread": False} if url.startswith("sqlite") else {}
+                )
+                SessionLocal.configure(bind=_engine)
+    return _engine
+
+def dispose_engine():
+    global _engine
+    with _engine_lock:
+        if _engine is not None:
+            _engine.dispose()
+            _engine = None
+
+def __getattr__(name):
+    # `from database import engine` keeps working, creating the engine lazily
+    if name == "engine":
+        return init_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+class LazySession:
+    """Stands in for a Session and creates it from SessionLocal on first use.
+
+    Requests rejected by auth dependencies never build a Session, and the pool
+    connection is only checked out once the first statement runs.
+    """
+
+    __slots__ = ("_session",)
+
+    def __init__(self):
+        self._session = None
+
+    def __getattr__(self, name):
+        if self._session is None:
+            if _engine is None:
+                init_engine()
+            self._session = SessionLocal()
+        return getattr(self._session, name)
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+def get_db():
+    db = LazySession()
     try:
         yield db
     finally:
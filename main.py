@@ -1,15 +1,50 @@
-from fastapi import FastAPI, Request
+from fastapi import FastAPI
+from contextlib import asynccontextmanager
 from routes.authors import router as authors_router
 from routes.books import router as books_router
 from routes.users import router as user_router
-from database import engine, Base
+from routes.loans import router as loans_router
+from routes.stats import router as stats_router
+from routes.profiling import router as profiling_router
+from routes.metrics import router as metrics_router
+from app.loans import loan_writer
+from app.stats import catalog_stats
+from app.revocation import revocation_list
+from app.versions import catalog_versions
+from app.profiling import SQLProfilingMiddleware, install_sql_profiling
+from app.metrics import MetricsMiddleware, mark_process_dead
+from app.compression import CompressionMiddleware
+from app.deps import AuthError, auth_error_handler
+from database import init_engine, dispose_engine
 
-# Create tables
-Base.metadata.create_all(bind=engine)
+# Tables are created by `python migrate.py`, not at import time
 
-app = FastAPI(title="LMS with FastAPI", description="Learning Management System", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    install_sql_profiling(init_engine())
+    loan_writer.start()
+    catalog_stats.start()
+    revocation_list.start()
+    catalog_versions.start()
+    yield
+    catalog_versions.stop()
+    loan_writer.stop()
+    catalog_stats.stop()
+    revocation_list.stop()
+    dispose_engine()
+    mark_process_dead()
+
+app = FastAPI(title="LMS with FastAPI", description="Learning Management System", version="1.0.0", lifespan=lifespan)
+
+app.add_exception_handler(AuthError, auth_error_handler)
+app.add_middleware(SQLProfilingMiddleware)
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(user_router, prefix="/api/v1/users")
 app.include_router(authors_router, prefix="/api/v1/authors")
 app.include_router(books_router, prefix="/api/v1/books")
-
+app.include_router(loans_router, prefix="/api/v1/loans")
+app.include_router(stats_router, prefix="/api/v1/stats")
+app.include_router(profiling_router, prefix="/api/v1/profiling")
+app.include_router(metrics_router, prefix="/metrics")
@@ -0,0 +1,52 @@
+"""Create or upgrade the database schema.
+
+    python migrate.py                 # create missing tables and book constraints, extend loan partitions
+    python migrate.py --rebuild-stats # also recount catalog_stats from the source tables
+    python migrate.py --reset-etags   # invalidate every book/author ETag, on every host
+
+Run once per deploy, before starting the workers; the app itself never issues DDL.
+"""
+import sys
+import argparse
+import app.models  # noqa: F401 - registers every table on Base.metadata
+from database import Base, SessionLocal, init_engine
+from app.loans import add_loan_partitions
+from app.catalog import add_book_unique_constraints
+from app.stats import rebuild_catalog_stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Create or upgrade the LMS database schema.")
+    parser.add_argument("--rebuild-stats", action="store_true", help="recount catalog_stats after migrating")
+    parser.add_argument("--reset-etags", action="store_true", help="invalidate all ETags, e.g. after writing to the catalog outside the API")
+    args = parser.parse_args()
+
+    engine = init_engine()
+    Base.metadata.create_all(bind=engine)
+    print("Schema is up to date.")
+
+    db = SessionLocal()
+    try:
+        duplicates = add_book_unique_constraints(db)
+        db.commit()
+        added = add_loan_partitions(db)
+        db.commit()
+        if added:
+            print("Added loan partitions: " + ", ".join(added))
+        if args.rebuild_stats:
+            rebuild_catalog_stats(db)
+            print("Rebuilt catalog statistics.")
+        if args.reset_etags:
+            from app.versions import catalog_versions
+            catalog_versions.reset(db)
+            print("Reset catalog ETags.")
+    finally:
+        db.close()
+
+    if duplicates:
+        for name, groups in duplicates.items():
+            print(f"Not adding {name}: duplicate books " + "; ".join(", ".join(map(str, ids)) for ids in groups))
+        print("Merge or delete the duplicates and run migrate.py again; until then the API accepts such duplicates.")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,20 @@
 import os
+import heapq
 from datetime import datetime
 from typing import Optional, Any, Dict, List, Set
 import json
 
 from fastapi import APIRouter
-from fastapi.responses import JSONResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy import (
-    select, and_, or_, desc, func
+    select, update, and_, or_, desc, func, event, inspect
 )
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, object_session
 from models import *
+from ticket_records import AssigneeRecord, AttachmentRecord, group_rows
+from ticket_cache import ticket_list_cache, scope_fingerprint
+from ticket_id_sets import ACCESSIBLE_TICKET_IDS, PAGE_TICKET_IDS, load_ticket_ids, ids_condition
 
 # Use ORM tables for raw SQL - best of both worlds
 tickets = Tickets.__table__
@@ -111,7 +116,7 @@ def build_search_filters(
     # Access control
     access_conditions = []
     if accessible_ticket_ids:
-        access_conditions.append(tickets.c.id.in_(accessible_ticket_ids))
+        access_conditions.append(ids_condition(tickets.c.id, accessible_ticket_ids))
     if reporting_user_ids:
         access_conditions.append(tickets.c.assigned_to_id.in_(reporting_user_ids))
     
@@ -175,8 +180,11 @@ def build_search_filters(
     
     return and_(*conditions) if conditions else None
 
-async def get_main_ticket_data(async_db:Session, where_conditions, contact_type_id=None, segmentations_id=None):
-    """Get main ticket data with INNER JOINs for mandatory relations"""
+def main_ticket_select():
+    """SELECT for the main ticket data, with INNER JOINs for mandatory relations, without filters.
+
+    Built once into MAIN_TICKET_SELECT at import; called again only by benchmarks/ticket_statement_build.py.
+    """
     
     # Aliases for users in different roles
     assigned_user = users.alias("assigned_user")
@@ -241,12 +249,14 @@ async def get_main_ticket_data(async_db:Session, where_conditions, contact_type_
             tickets.c.ticket_source_id,
             tickets.c.purpose_type_id,
             tickets.c.SLA,
+            tickets.c.replies_count,
             
             # Contact info (optional)
             contacts.c.name.label("contact_db_name"),
             contacts.c.picture_url.label("contact_avatar"),
             contacts.c.contact_type_id,
             contacts.c.segmentations_id,
+            contacts.c.preferred_phone,
             
             # Priority info (INNER JOIN - mandatory)
             priorities.c.name.label("priority_name"),
@@ -287,6 +297,17 @@ async def get_main_ticket_data(async_db:Session, where_conditions, contact_type_
             desc(tickets.c.created_at)
         )
     )
+    return stmt
+
+MAIN_TICKET_SELECT = main_ticket_select()
+
+def build_main_ticket_query(where_conditions, contact_type_id=None, segmentations_id=None):
+    """MAIN_TICKET_SELECT with the search filters applied.
+
+    Filter values are bound parameters (IN lists expand at execution), so requests using the same set of
+    filters produce the same cache key and reuse SQLAlchemy's compiled SQL.
+    """
+    stmt = MAIN_TICKET_SELECT
     
     # Apply base WHERE conditions
     if where_conditions is not None:
@@ -299,40 +320,34 @@ async def get_main_ticket_data(async_db:Session, where_conditions, contact_type_
     if segmentations_id is not None:
         stmt = stmt.where(contacts.c.segmentations_id == segmentations_id)
     
-    result =  async_db.execute(stmt)
+    return stmt
+
+async def get_main_ticket_data(async_db:Session, where_conditions, contact_type_id=None, segmentations_id=None):
+    """Get main ticket data with INNER JOINs for mandatory relations"""
+    result =  async_db.execute(build_main_ticket_query(where_conditions, contact_type_id, segmentations_id))
     return result.mappings().all()
 
 async def get_related_data(async_db:Session, ticket_ids: List[int]):
-    """Get related data for tickets - only what's used in JSON response"""
+    """Get related data for tickets - only what's used in JSON response (see load_related_data)."""
+    return load_related_data(async_db, ticket_ids)
+
+def load_related_data(async_db:Session, ticket_ids: List[int]):
+    """get_related_data as a plain function, for callers running in a worker thread.
+
+    Assignees and attachments are grouped into compact records (see ticket_records.py);
+    each statement selects the grouping column first, then the record's fields in order.
+    """
     relations = {
-        'phone_numbers': {},
         'assignees': {},
         'attachments': {},
-        'replies_count': {},
         'notification_types': {}
     }
     
     if not ticket_ids:
         return relations
-    
-    # Phone numbers for contacts
-    phone_stmt = select(
-        contacts_phone_numbers.c.contact_id,
-        contacts_phone_numbers.c.phone_number,
-        contacts_phone_numbers.c.is_preferred
-    ).where(
-        contacts_phone_numbers.c.contact_id.in_(
-            select(tickets.c.contact_id).where(
-                and_(tickets.c.id.in_(ticket_ids), tickets.c.contact_id.isnot(None))
-            )
-        )
-    )
-    phone_result =  async_db.execute(phone_stmt)
-    for row in phone_result.mappings():
-        contact_id = row['contact_id']
-        if contact_id not in relations['phone_numbers']:
-            relations['phone_numbers'][contact_id] = []
-        relations['phone_numbers'][contact_id].append(row)
+
+    # Sent once: literal for small pages, a session temp table above the threshold
+    ticket_ids = load_ticket_ids(async_db, ticket_ids, PAGE_TICKET_IDS)
     
     # Assignee users
     assignees_stmt = (
@@ -352,14 +367,9 @@ async def get_related_data(async_db:Session, ticket_ids: List[int]):
                 )
             )
         )
-        .where(ticket_assignees.c.ticket_id.in_(ticket_ids))
+        .where(ids_condition(ticket_assignees.c.ticket_id, ticket_ids))
     )
-    assignees_result =  async_db.execute(assignees_stmt)
-    for row in assignees_result.mappings():
-        ticket_id = row['ticket_id']
-        if ticket_id not in relations['assignees']:
-            relations['assignees'][ticket_id] = []
-        relations['assignees'][ticket_id].append(row)
+    relations['assignees'] = group_rows(async_db.execute(assignees_stmt), AssigneeRecord)
     
     # Attachment data
     attachments_stmt = select(
@@ -367,26 +377,9 @@ async def get_related_data(async_db:Session, ticket_ids: List[int]):
         ticket_attachments.c.id,
         ticket_attachments.c.file_url,
         ticket_attachments.c.uploaded_by
-    ).where(ticket_attachments.c.ticket_id.in_(ticket_ids))
-    
-    attachments_result =  async_db.execute(attachments_stmt)
-    for row in attachments_result.mappings():
-        ticket_id = row['ticket_id']
-        if ticket_id not in relations['attachments']:
-            relations['attachments'][ticket_id] = []
-        relations['attachments'][ticket_id].append(row)
-    
-    # Reply counts
-    replies_stmt = select(
-        ticket_replies.c.ticket_id,
-        func.count().label('count')
-    ).where(
-        ticket_replies.c.ticket_id.in_(ticket_ids)
-    ).group_by(ticket_replies.c.ticket_id)
-    
-    replies_result =  async_db.execute(replies_stmt)
-    for row in replies_result:
-        relations['replies_count'][row.ticket_id] = row.count
+    ).where(ids_condition(ticket_attachments.c.ticket_id, ticket_ids))
+    
+    relations['attachments'] = group_rows(async_db.execute(attachments_stmt), AttachmentRecord)
     
     # Notification types
     notification_stmt = select(
@@ -400,62 +393,70 @@ async def get_related_data(async_db:Session, ticket_ids: List[int]):
     
     return relations
 
-def organize_ticket_families(tickets):
-    """Organize tickets by families - parents first, then children"""
-    parent_map = {}
-    root_tickets = []
-    
-    for ticket in tickets:
-        if ticket['parent_id'] is None:
-            root_tickets.append(ticket)
-            parent_map[ticket['id']] = []
-    
+def iter_ticket_families(tickets):
+    """Yield tickets family by family: each root (newest first), then its descendants depth-first, oldest child first.
+
+    One grouping pass, no sorting: get_main_ticket_data orders by ``parent_id, created_at DESC``, so rows sharing
+    a parent already arrive newest first. Children whose parent is not in the list (orphans) are merged in among the
+    roots by ``created_at``; tickets only reachable through a ``parent_id`` cycle are emitted last, each once.
+    """
+    children = {}
+    ids = set()
     for ticket in tickets:
-        if ticket['parent_id'] is not None and ticket['parent_id'] in parent_map:
-            parent_map[ticket['parent_id']].append(ticket)
-        elif ticket['parent_id'] is not None:
-            # Orphan child
-            root_tickets.append(ticket)
-    
-    # Build ordered list
-    organized = []
-    for parent in sorted(root_tickets, key=lambda x: x['created_at'], reverse=True):
-        organized.append(parent)
-        if parent['id'] in parent_map:
-            children = sorted(parent_map[parent['id']], key=lambda x: x['created_at'])
-            organized.extend(children)
-    
-    return organized
+        ids.add(ticket['id'])
+        group = children.get(ticket['parent_id'])
+        if group is None:
+            group = children[ticket['parent_id']] = []
+        group.append(ticket)
+
+    roots = children.get(None, [])
+    orphan_groups = [group for parent_id, group in children.items() if parent_id is not None and parent_id not in ids]
+    emitted = set()
+
+    def family(root):
+        stack = [root]
+        while stack:
+            ticket = stack.pop()
+            if ticket['id'] in emitted:
+                continue
+            emitted.add(ticket['id'])
+            yield ticket
+            # Groups are newest first, so the stack pops the oldest child first
+            stack.extend(children.get(ticket['id'], ()))
+
+    if orphan_groups:
+        roots = heapq.merge(roots, *orphan_groups, key=lambda ticket: ticket['created_at'], reverse=True)
+    for root in roots:
+        yield from family(root)
+
+    if len(emitted) < len(ids):
+        unreached = [ticket for ticket in tickets if ticket['id'] not in emitted]
+        for ticket in sorted(unreached, key=lambda ticket: ticket['created_at'], reverse=True):
+            yield from family(ticket)
+
+def organize_ticket_families(tickets):
+    """Organize tickets by families - parents first, then children (any depth)"""
+    return list(iter_ticket_families(tickets))
 
 def serialize_ticket_data(ticket_row, relations):
     """Convert ticket row to JSON format with only required fields"""
     ticket_id = ticket_row['id']
-    contact_id = ticket_row['contact_id']
     
-    # Contact info
+    # Contact info; contacts.preferred_phone is maintained from the contact's phone numbers
     contact_name = ticket_row['contact_db_name'] or ticket_row['contact_name']
-    contact_phone_no = ticket_row['contact_phone_no']
+    contact_phone_no = ticket_row['preferred_phone'] or ticket_row['contact_phone_no']
     avatar = ticket_row['contact_avatar']
     
-    # Get preferred phone if available
-    if contact_id and contact_id in relations['phone_numbers']:
-        phones = relations['phone_numbers'][contact_id]
-        preferred = next((p for p in phones if p.get('is_preferred')), None)
-        if preferred:
-            contact_phone_no = preferred['phone_number']
-        elif phones:
-            contact_phone_no = phones[0]['phone_number']
-    
     # Assignee users (only user type as per your JSON)
     assignee_users = []
     if ticket_id in relations['assignees']:
         for assignee in relations['assignees'][ticket_id]:
-            if assignee['assignee_type'] == 'user' and assignee['user_name']:
+            if assignee.assignee_type == 'user' and assignee.user_name:
                 assignee_users.append({
-                    'id': assignee['assignee_id'],
-                    'name': assignee['user_name'],
-                    'email': assignee['user_email'],
-                    'avatar': assignee['user_picture'],
+                    'id': assignee.assignee_id,
+                    'name': assignee.user_name,
+                    'email': assignee.user_email,
+                    'avatar': assignee.user_picture,
                     'teams': []  # Can be populated if needed
                 })
     
@@ -514,9 +515,9 @@ def serialize_ticket_data(ticket_row, relations):
     if ticket_id in relations['attachments']:
         attachments = [
             {
-                "id": att['id'],
-                "file_url": att['file_url'],
-                "uploaded_by": att['uploaded_by']
+                "id": att.id,
+                "file_url": att.file_url,
+                "uploaded_by": att.uploaded_by
             }
             for att in relations['attachments'][ticket_id]
         ]
@@ -567,7 +568,302 @@ def serialize_ticket_data(ticket_row, relations):
         "attachments": attachments,
         "purpose": purpose,
         "meta_data": meta_data,
-        "replies_count": relations['replies_count'].get(ticket_id, 0),
+        "replies_count": ticket_row['replies_count'] or 0,
         "assignee_users": assignee_users
     }
 
+async def get_ticket_list(async_db: Session, user_id: int, reporting_user_ids: List[int] = None, **filters) -> bytes:
+    """Serialized (JSON) ticket list for the user's view and ``build_search_filters`` arguments.
+
+    Served from ticket_list_cache when the same filters were run for the same access scope; a hit runs no query.
+    """
+    token = ticket_list_cache.begin()
+    scope_key = (user_id, tuple(sorted(reporting_user_ids or ())))
+    scope = ticket_list_cache.get_scope(scope_key)
+    if scope is None:
+        accessible_ticket_ids = await get_all_accessible_tickets_comprehensive(async_db, user_id)
+        fingerprint = scope_fingerprint(accessible_ticket_ids, reporting_user_ids)
+        ticket_list_cache.put_scope(scope_key, fingerprint, accessible_ticket_ids, token)
+    else:
+        fingerprint, accessible_ticket_ids = scope
+
+    key = ticket_list_cache.key(fingerprint, filters)
+    body = ticket_list_cache.get(key)
+    if body is not None:
+        return body
+
+    # A TicketIdSet: large scopes go to a temp table instead of a huge IN list
+    accessible_ticket_ids = load_ticket_ids(async_db, accessible_ticket_ids, ACCESSIBLE_TICKET_IDS)
+    where_conditions = build_search_filters(
+        accessible_ticket_ids=accessible_ticket_ids, reporting_user_ids=reporting_user_ids, **filters
+    )
+    ticket_rows = await get_main_ticket_data(
+        async_db, where_conditions, filters.get('contact_type_id'), filters.get('segmentations_id')
+    )
+    ticket_ids = [row['id'] for row in ticket_rows]
+    relations = await get_related_data(async_db, ticket_ids)
+    body = json.dumps(
+        [serialize_ticket_data(ticket, relations) for ticket in iter_ticket_families(ticket_rows)], default=str
+    ).encode()
+    ticket_list_cache.put(key, body, ticket_ids, token)
+    return body
+
+EXPORT_WINDOW = 1000
+
+async def iter_ticket_export(session_factory, accessible_ticket_ids: List[int] = None, reporting_user_ids: List[int] = None,
+                             window: int = EXPORT_WINDOW, **filters):
+    """Yield every matching ticket as NDJSON (bytes), ``window`` tickets at a time, in constant memory.
+
+    Takes the access scope and ``build_search_filters`` arguments, not built conditions: a large scope goes into a
+    temp table, which only the connection that loaded it can read, so it is loaded here on the streaming session.
+    Rows stream from a server-side cursor, which keeps its connection busy until it is exhausted, so each window's
+    relations are loaded on a second session. Both sessions come from ``session_factory`` and are opened and closed
+    here: a request-scoped session would be closed before the response starts streaming. Each window's queries and
+    serialization run in the threadpool, so a long export does not block the event loop. Tickets come in SQL order
+    (``parent_id``, ``created_at DESC``), not grouped into families; each line carries its ``parent_id``.
+    """
+    stream_db = session_factory()
+    relation_db = session_factory()
+    result = None
+
+    def execute():
+        ticket_ids = accessible_ticket_ids
+        if ticket_ids is not None:
+            ticket_ids = load_ticket_ids(stream_db, ticket_ids, ACCESSIBLE_TICKET_IDS)
+        where_conditions = build_search_filters(
+            accessible_ticket_ids=ticket_ids, reporting_user_ids=reporting_user_ids, **filters
+        )
+        stmt = build_main_ticket_query(
+            where_conditions, filters.get('contact_type_id'), filters.get('segmentations_id')
+        ).execution_options(stream_results=True, yield_per=window)
+        return stream_db.execute(stmt)
+
+    def next_window(partitions):
+        ticket_rows = next(partitions, None)
+        if ticket_rows is None:
+            return None
+        relations = load_related_data(relation_db, [row['id'] for row in ticket_rows])
+        return b"".join(
+            json.dumps(serialize_ticket_data(row, relations), default=str).encode() + b"\n" for row in ticket_rows
+        )
+
+    try:
+        result = await run_in_threadpool(execute)
+        partitions = result.mappings().partitions(window)
+        while True:
+            chunk = await run_in_threadpool(next_window, partitions)
+            if chunk is None:
+                break
+            yield chunk
+    finally:
+        if result is not None:
+            result.close()
+        relation_db.close()
+        stream_db.close()
+
+def ticket_export_response(session_factory, accessible_ticket_ids: List[int] = None, reporting_user_ids: List[int] = None,
+                           window: int = EXPORT_WINDOW, **filters):
+    """Streaming ``application/x-ndjson`` response for iter_ticket_export, which owns its sessions."""
+    return StreamingResponse(
+        iter_ticket_export(session_factory, accessible_ticket_ids, reporting_user_ids, window, **filters),
+        media_type="application/x-ndjson",
+    )
+
+# ---- Preferred phone per contact ----
+# contacts.preferred_phone (VARCHAR, nullable; on MySQL: ALTER TABLE contacts ADD COLUMN preferred_phone VARCHAR(32) NULL)
+# holds the contact's preferred number, else its first one, so the ticket list reads it through the main join.
+# ORM phone writes keep it current in the same transaction; refresh_preferred_phones backfills it and repairs
+# contacts changed by Core/bulk statements.
+
+def preferred_phone_query(contact_id_column):
+    return (
+        select(contacts_phone_numbers.c.phone_number)
+        .where(contacts_phone_numbers.c.contact_id == contact_id_column)
+        .order_by(contacts_phone_numbers.c.is_preferred.desc(), contacts_phone_numbers.c.id.asc())
+        .limit(1)
+        .scalar_subquery()
+    )
+
+def refresh_preferred_phones(db: Session, contact_ids: List[int] = None, batch_size: int = 1000) -> int:
+    """Recompute contacts.preferred_phone for ``contact_ids`` (all contacts if None) in committed batches."""
+    updated = 0
+    last_id = 0
+    while True:
+        if contact_ids is None:
+            batch = db.execute(
+                select(contacts.c.id).where(contacts.c.id > last_id).order_by(contacts.c.id).limit(batch_size)
+            ).scalars().all()
+        else:
+            batch = contact_ids[updated:updated + batch_size]
+        if not batch:
+            return updated
+        db.execute(
+            update(contacts).where(contacts.c.id.in_(batch)).values(preferred_phone=preferred_phone_query(contacts.c.id))
+        )
+        db.commit()
+        updated += len(batch)
+        last_id = batch[-1]
+
+@event.listens_for(ContactsPhoneNumber, 'after_insert')
+@event.listens_for(ContactsPhoneNumber, 'after_update')
+@event.listens_for(ContactsPhoneNumber, 'after_delete')
+def _phone_number_changed(mapper, connection, target):
+    contact_ids = {target.contact_id}
+    contact_ids.update(inspect(target).attrs.contact_id.history.deleted or ())   # moved to another contact
+    contact_ids.discard(None)
+    if contact_ids:
+        connection.execute(
+            update(contacts).where(contacts.c.id.in_(contact_ids)).values(preferred_phone=preferred_phone_query(contacts.c.id))
+        )
+
+# ---- Reply counter per ticket ----
+# tickets.replies_count (on MySQL: ALTER TABLE tickets ADD COLUMN replies_count INT NOT NULL DEFAULT 0, then run
+# reconcile_replies_count once) is adjusted in the same transaction as each ORM reply insert/delete.
+# reconcile_replies_count repairs drift from Core/bulk statements; run it from a scheduler.
+
+def _adjust_replies_count(connection, ticket_id, delta: int):
+    if ticket_id is not None:
+        connection.execute(
+            update(tickets).where(tickets.c.id == ticket_id).values(replies_count=tickets.c.replies_count + delta)
+        )
+
+@event.listens_for(TicketReplies, 'after_insert')
+def _reply_inserted(mapper, connection, target):
+    _adjust_replies_count(connection, target.ticket_id, 1)
+
+@event.listens_for(TicketReplies, 'after_delete')
+def _reply_deleted(mapper, connection, target):
+    _adjust_replies_count(connection, target.ticket_id, -1)
+
+@event.listens_for(TicketReplies, 'after_update')
+def _reply_moved(mapper, connection, target):
+    history = inspect(target).attrs.ticket_id.history
+    if history.deleted:
+        for previous_ticket_id in history.deleted:
+            _adjust_replies_count(connection, previous_ticket_id, -1)
+        _adjust_replies_count(connection, target.ticket_id, 1)
+
+def reconcile_replies_count(db: Session, batch_size: int = 1000) -> int:
+    """Reset tickets.replies_count from ticket_replies wherever they differ, one id range per transaction.
+
+    Cached ticket lists are dropped after each range that corrected something. Returns the number of tickets corrected.
+    """
+    actual = (
+        select(func.count()).select_from(ticket_replies)
+        .where(ticket_replies.c.ticket_id == tickets.c.id)
+        .scalar_subquery()
+    )
+    corrected = 0
+    last_id = 0
+    while True:
+        window = select(tickets.c.id).where(tickets.c.id > last_id).order_by(tickets.c.id).limit(batch_size).subquery()
+        upper = db.execute(select(func.max(window.c.id))).scalar()
+        if upper is None:
+            return corrected
+        result = db.execute(
+            update(tickets)
+            .where(tickets.c.id > last_id, tickets.c.id <= upper, tickets.c.replies_count != actual)
+            .values(replies_count=actual)
+        )
+        db.commit()
+        if result.rowcount:
+            ticket_list_cache.invalidate_all()
+        corrected += result.rowcount
+        last_id = upper
+
+# ---- Ticket list cache invalidation ----
+# ORM writes are recorded at flush and applied after COMMIT, so a concurrent read cannot re-cache
+# pre-commit rows. Core bulk statements bypass these events and must call ticket_list_cache directly.
+
+# Columns build_search_filters/get_main_ticket_data filter or order on: changing one can move a ticket between views
+TICKET_VIEW_COLUMNS = (
+    'ticket_id', 'parent_id', 'title', 'ticket_status_id', 'priority_id', 'contact_id', 'tags', 'requested_email',
+    'to_recipients', 'cc_recipients', 'created_at', 'is_deleted', 'assigned_to_id', 'created_by_id',
+)
+
+# Rows joined into every page (names, labels, avatars, SLA), and users, whose department and company also decide
+# their scope: the columns that matter, None for any. A new row is not on any cached page yet, so inserts do not count.
+PAGE_LOOKUP_COLUMNS = {
+    User: ('name', 'email', 'picture', 'company_department_id', 'company_id'),
+    Contact: ('name', 'picture_url', 'contact_type_id', 'segmentations_id', 'preferred_phone'),
+    Priority: None, TicketStatusByDept: None, CompanyDepartment: None, Department: None, TicketSource: None,
+    Purpose: None, SlaConfiguration: None, NotificationType: None,
+}
+
+def _pending_ticket_changes(target) -> dict:
+    return object_session(target).info.setdefault('ticket_list_changes', {'all': False, 'ids': set()})
+
+def _columns_changed(target, table, names) -> bool:
+    state = inspect(target)
+    return any(
+        state.attrs[state.mapper.get_property_by_column(table.c[name]).key].history.has_changes()
+        for name in names
+    )
+
+def _ticket_changes_views(target) -> bool:
+    return _columns_changed(target, tickets, TICKET_VIEW_COLUMNS)
+
+@event.listens_for(Tickets, 'after_insert')
+@event.listens_for(Tickets, 'after_delete')
+@event.listens_for(TicketAssignee, 'after_insert')
+@event.listens_for(TicketAssignee, 'after_update')
+@event.listens_for(TicketAssignee, 'after_delete')
+@event.listens_for(TeamUser, 'after_insert')
+@event.listens_for(TeamUser, 'after_update')
+@event.listens_for(TeamUser, 'after_delete')
+def _ticket_views_changed(mapper, connection, target):
+    # New tickets, (re)assignments and team membership change which tickets match a view or a user's scope
+    _pending_ticket_changes(target)['all'] = True
+
+def _lookup_updated(mapper, connection, target):
+    columns = PAGE_LOOKUP_COLUMNS[mapper.class_]
+    if columns is None or _columns_changed(target, mapper.local_table, columns):
+        _pending_ticket_changes(target)['all'] = True
+
+for _lookup in PAGE_LOOKUP_COLUMNS:
+    event.listen(_lookup, 'after_update', _lookup_updated)
+    event.listen(_lookup, 'after_delete', _ticket_views_changed)
+
+@event.listens_for(Tickets, 'after_update')
+def _ticket_updated(mapper, connection, target):
+    changes = _pending_ticket_changes(target)
+    if _ticket_changes_views(target):
+        changes['all'] = True
+    else:
+        changes['ids'].add(target.id)
+
+@event.listens_for(TicketReplies, 'after_insert')
+@event.listens_for(TicketReplies, 'after_delete')
+@event.listens_for(TicketAttachment, 'after_insert')
+@event.listens_for(TicketAttachment, 'after_update')
+@event.listens_for(TicketAttachment, 'after_delete')
+def _ticket_relation_changed(mapper, connection, target):
+    _pending_ticket_changes(target)['ids'].add(target.ticket_id)
+
+@event.listens_for(TicketReplies, 'after_update')
+def _reply_updated(mapper, connection, target):
+    # A moved reply changes replies_count on both tickets (_reply_moved updates them with Core, so no Tickets event)
+    ids = _pending_ticket_changes(target)['ids']
+    ids.add(target.ticket_id)
+    ids.update(inspect(target).attrs.ticket_id.history.deleted)
+
+@event.listens_for(ContactsPhoneNumber, 'after_insert')
+@event.listens_for(ContactsPhoneNumber, 'after_update')
+@event.listens_for(ContactsPhoneNumber, 'after_delete')
+def _contact_phone_changed(mapper, connection, target):
+    # Pages show contacts.preferred_phone, and the reverse index has no contact -> ticket entries
+    _pending_ticket_changes(target)['all'] = True
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_ticket_lists(session):
+    changes = session.info.pop('ticket_list_changes', None)
+    if changes is None:
+        return
+    if changes['all']:
+        ticket_list_cache.invalidate_all()
+    elif changes['ids']:
+        ticket_list_cache.invalidate_tickets(changes['ids'])
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_ticket_list_changes(session):
+    session.info.pop('ticket_list_changes', None)
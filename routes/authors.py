@@ -2,39 +2,43 @@ from typing import List
 from database import get_db
 from sqlalchemy.orm import Session
 from app.models import Author, User
-from fastapi.responses import JSONResponse
-from app.deps import get_current_user,is_admin
+from app.stats import catalog_stats, author_books_key
+from app.responses import JSONResponse
+from app.singleflight import author_reads
+from app.versions import catalog_versions, conditional, author_key, AUTHORS, BOOKS, BOOK_AUTHORS
+from app.deps import require_role, ADMIN
 from app.schemas import AuthorCreate,AuthorUpdate,AuthorOut
-from fastapi import  Depends, HTTPException, status, APIRouter
+from app.catalog import MAX_BATCH_IDS, fetch_authors, in_request_order, unique_ids
+from fastapi import  Depends, HTTPException, Query, status, APIRouter
 
 
 
 router = APIRouter()
 
 @router.post("/create-authors", response_model=AuthorOut)
-def create_author(author_data: AuthorCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    if not is_admin(current_user):
-        existing_author=db.query(Author).filter(Author.name == author_data.name).first()                
-        if existing_author:
-            return JSONResponse(content={"status":status.HTTP_400_BAD_REQUEST,"message": "Author already exists"}, status_code=status.HTTP_400_BAD_REQUEST)
-        db_author = Author(**author_data.dict())
-        db.add(db_author)
-        db.commit()
-        db.refresh(db_author)
-        
-        author_out = AuthorOut(
-            id=db_author.id,
-            name=db_author.name,
-            bio=db_author.bio
-        )
-        
-        return JSONResponse(
-            content={"status": status.HTTP_201_CREATED, "message": "Author created successfully", "data": author_out.dict()},
-            status_code=status.HTTP_201_CREATED )
-    else:
-        return JSONResponse(content={"status":status.HTTP_401_UNAUTHORIZED,"message": "Only admin has the authority to create the author"}, status_code=status.HTTP_401_UNAUTHORIZED)
+def create_author(author_data: AuthorCreate, current_user: User = Depends(require_role(ADMIN, "Only admin has the authority to create the author", status.HTTP_401_UNAUTHORIZED)), db: Session = Depends(get_db)):
+    existing_author=db.query(Author).filter(Author.name == author_data.name).first()                
+    if existing_author:
+        return JSONResponse(content={"status":status.HTTP_400_BAD_REQUEST,"message": "Author already exists"}, status_code=status.HTTP_400_BAD_REQUEST)
+    db_author = Author(**author_data.dict())
+    db.add(db_author)
+    db.commit()
+    catalog_versions.bump(db, AUTHORS)
+    catalog_stats.record({"authors_total": 1})
+    
+    author_out = AuthorOut(
+        id=db_author.id,
+        name=db_author.name,
+        bio=db_author.bio
+    )
+    
+    return JSONResponse(
+        content={"status": status.HTTP_201_CREATED, "message": "Author created successfully", "data": author_out.dict()},
+        status_code=status.HTTP_201_CREATED )
 
 @router.get("/get-authors", response_model=list[AuthorOut])
+@conditional(AUTHORS)
+@author_reads.coalesce()
 def get_authors(db: Session = Depends(get_db)):
     authors = db.query(Author).all()
     if not authors:
@@ -47,47 +51,57 @@ def get_authors(db: Session = Depends(get_db)):
     return JSONResponse( content={"status": status.HTTP_200_OK, "message": "Authors retrieved successfully", "data": [author.dict() for author in authors_data]},status_code=status.HTTP_200_OK )
 
 @router.get("/get-authors-byId/{author_id}", response_model=AuthorOut)
+@conditional(author_key("{author_id}"), params=("author_id",))
+@author_reads.coalesce("author_id")
 def get_author(author_id: int, db: Session = Depends(get_db)):
-    author = db.query(Author).filter(Author.id == author_id).first()
+    author = fetch_authors(db, [author_id]).get(author_id)
     if not author:
         return JSONResponse(content={"status": status.HTTP_404_NOT_FOUND, "message": "Author not found"}, status_code=status.HTTP_404_NOT_FOUND )
-    author_out = AuthorOut.from_orm(author)
     
-    return JSONResponse(content={"status": status.HTTP_200_OK, "message": "Author retrieved successfully", "data": author_out.dict()},status_code=status.HTTP_200_OK)
+    return JSONResponse(content={"status": status.HTTP_200_OK, "message": "Author retrieved successfully", "data": author},status_code=status.HTTP_200_OK)
+
+@router.get("/get-authors-byIds", response_model=list[AuthorOut])
+@conditional(AUTHORS, params=("ids",))
+@author_reads.coalesce("ids")
+def get_authors_by_ids(ids: List[int] = Query(..., description=f"Up to {MAX_BATCH_IDS} author IDs, e.g. ?ids=1&ids=2"), db: Session = Depends(get_db)):
+    ids = unique_ids(ids)
+    if len(ids) > MAX_BATCH_IDS:
+        return JSONResponse(content={"status": status.HTTP_400_BAD_REQUEST, "message": f"At most {MAX_BATCH_IDS} IDs per request"}, status_code=status.HTTP_400_BAD_REQUEST)
+    authors, missing = in_request_order(ids, fetch_authors(db, ids))
+    return JSONResponse(content={"status": status.HTTP_200_OK, "message": "Authors retrieved successfully", "data": authors, "missing": missing}, status_code=status.HTTP_200_OK)
 
 @router.put("/update-authors/{author_id}", response_model=AuthorOut)
-def update_author(author_id: int, author: AuthorUpdate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    if not is_admin(current_user):
-        db_author = db.query(Author).filter(Author.id == author_id).first()
-        if not db_author:
-            return JSONResponse(content={"status": status.HTTP_404_NOT_FOUND, "message": "Author not found"}, status_code=status.HTTP_404_NOT_FOUND)
-        # for key, value in author.dict().items(): this method can be also used to update the author
-        #     setattr(db_author, key, value)
-        if author.name is not None:
-            db_author.name = author.name
-        if author.bio is not None:
-            db_author.bio = author.bio
-        existing_author=db.query(Author).filter(Author.name == author.name).first()                
-        if existing_author:
-            return JSONResponse(content={"status":status.HTTP_400_BAD_REQUEST,"message": "Author already Updated"}, status_code=status.HTTP_400_BAD_REQUEST)
-        db.commit()
-        db.refresh(db_author)
-        updated_data = AuthorOut.from_orm(db_author)
-        return JSONResponse(content={"status": status.HTTP_200_OK, "message": "Author updated successfully", "data": updated_data.dict()}, status_code=status.HTTP_200_OK)
-    else:
-       return JSONResponse(content={"status": status.HTTP_401_UNAUTHORIZED, "message": "Only admin has the authority to update the author"}, status_code=status.HTTP_401_UNAUTHORIZED)
+def update_author(author_id: int, author: AuthorUpdate, current_user: User = Depends(require_role(ADMIN, "Only admin has the authority to update the author", status.HTTP_401_UNAUTHORIZED)), db: Session = Depends(get_db)):
+    db_author = db.query(Author).filter(Author.id == author_id).first()
+    if not db_author:
+        return JSONResponse(content={"status": status.HTTP_404_NOT_FOUND, "message": "Author not found"}, status_code=status.HTTP_404_NOT_FOUND)
+    # for key, value in author.dict().items(): this method can be also used to update the author
+    #     setattr(db_author, key, value)
+    if author.name is not None:
+        db_author.name = author.name
+    if author.bio is not None:
+        db_author.bio = author.bio
+    existing_author=db.query(Author).filter(Author.name == author.name).first()                
+    if existing_author:
+        return JSONResponse(content={"status":status.HTTP_400_BAD_REQUEST,"message": "Author already Updated"}, status_code=status.HTTP_400_BAD_REQUEST)
+    db.commit()
+    # Book responses carry the author's name, so every book ETag moves too
+    catalog_versions.bump(db, AUTHORS, author_key(author_id), BOOKS, BOOK_AUTHORS)
+    updated_data = AuthorOut.from_orm(db_author)
+    return JSONResponse(content={"status": status.HTTP_200_OK, "message": "Author updated successfully", "data": updated_data.dict()}, status_code=status.HTTP_200_OK)
 
 @router.delete("/delete-authors/{author_id}")
-def delete_author(author_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    if not is_admin(current_user):
-        db_author = db.query(Author).filter(Author.id == author_id).first()
-        if not db_author:
-            return JSONResponse(content={"status": status.HTTP_404_NOT_FOUND, "message": "Author not found"}, status_code=status.HTTP_404_NOT_FOUND)
-        db.delete(db_author)
-        db.commit()
-        return JSONResponse(content={"status": status.HTTP_200_OK, "message": "Author deleted successfully"}, status_code=status.HTTP_200_OK)
-    else:
-        return JSONResponse(content={"status": status.HTTP_401_UNAUTHORIZED, "message": "Only admin has the authority to delete the author"}, status_code=status.HTTP_401_UNAUTHORIZED)
+def delete_author(author_id: int, current_user: User = Depends(require_role(ADMIN, "Only admin has the authority to delete the author", status.HTTP_401_UNAUTHORIZED)), db: Session = Depends(get_db)):
+    db_author = db.query(Author).filter(Author.id == author_id).first()
+    if not db_author:
+        return JSONResponse(content={"status": status.HTTP_404_NOT_FOUND, "message": "Author not found"}, status_code=status.HTTP_404_NOT_FOUND)
+    # Deleting the author sets its books' author_id to NULL, so its per-author counter goes to zero
+    book_count = len(db_author.books)
+    db.delete(db_author)
+    db.commit()
+    catalog_versions.bump(db, AUTHORS, author_key(author_id), BOOKS, BOOK_AUTHORS)
+    catalog_stats.record({"authors_total": -1, author_books_key(author_id): -book_count})
+    return JSONResponse(content={"status": status.HTTP_200_OK, "message": "Author deleted successfully"}, status_code=status.HTTP_200_OK)
 
     
     
\ No newline at end of file
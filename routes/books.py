@@ -1,67 +1,79 @@
 from database import get_db
 from datetime import datetime
+from app.loans import loan_writer
+from app.stats import catalog_stats, author_books_key
 from sqlalchemy.orm import Session
-from fastapi_cache.decorator import cache
-from fastapi.responses import JSONResponse
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy import insert, literal, select
+from app.responses import JSONResponse
+from app.singleflight import book_reads
+from app.versions import catalog_versions, conditional, book_key, BOOKS, BOOK_AUTHORS
 from app.models import Book, Borrower, User,Author
 from app.schemas import BookCreate, BookUpdate,BookOut,BookSearch
-from app.deps import get_current_user, is_staff,is_admin,is_author
-from fastapi import FastAPI, Depends, HTTPException, status, APIRouter
+from app.deps import require_role, ADMIN, REGULAR
+from typing import List
+from app.catalog import MAX_BATCH_IDS, fetch_books, in_request_order, unique_ids
+from fastapi import Depends, Query, status, APIRouter
 
 
 router = APIRouter()
 
+def book_conflict_response(error: IntegrityError):
+    """Map a unique/foreign key violation on ``books`` to the API's validation messages."""
+    message = str(error.orig).lower()
+    violated = message.rsplit("for key", 1)[-1].rsplit("constraint failed:", 1)[-1]
+    if "isbn" in violated:
+        return JSONResponse(
+            content={"status": status.HTTP_400_BAD_REQUEST, "message": "A book with the same ISBN already exists."},
+            status_code=status.HTTP_400_BAD_REQUEST)
+    if "title" in violated:
+        return JSONResponse(
+            content={"status":status.HTTP_400_BAD_REQUEST,"message":"A book with the given records already exists."},
+            status_code=status.HTTP_400_BAD_REQUEST)
+    if "foreign key" in message:
+        return JSONResponse(
+            content={"status":status.HTTP_404_NOT_FOUND,"message":"Author Not Found"},
+            status_code=status.HTTP_404_NOT_FOUND)
+    raise error
+
 @router.post("/create-books", response_model=BookOut)
-def create_book(book: BookCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    if not is_admin(current_user):
-        
-        author = db.query(Author).filter(Author.id == book.author_id).first()
-        if not author:
+def create_book(book: BookCreate, current_user: User = Depends(require_role(ADMIN, "Only Admin has the authority To Create the Book")), db: Session = Depends(get_db)):
+    # Author lookup, ISBN and title/date uniqueness are all enforced by this one INSERT ... SELECT
+    insert_book = insert(Book).from_select(
+        ["title", "isbn", "author_id", "published_date"],
+        select(literal(book.title), literal(book.isbn), Author.id, literal(book.published_date)).where(Author.id == book.author_id)
+    )
+    try:
+        result = db.execute(insert_book)
+        if result.rowcount == 0:
+            db.rollback()
             return JSONResponse(
                 content={"status":status.HTTP_404_NOT_FOUND,"message":"Author Not Found"},
-                status_code=status.HTTP_404_NOT_FOUND)    
-                    
-        existing_book = db.query(Book).filter(Book.isbn == book.isbn).first()
-        if existing_book:
-            return JSONResponse(
-                content={"status": status.HTTP_400_BAD_REQUEST, "message": "A book with the same ISBN already exists."},
-                status_code=status.HTTP_400_BAD_REQUEST)
-            
-        existing_book = db.query(Book).filter(            
-            Book.title == book.title,            
-            Book.published_date == book.published_date
-        ).first()
-
-        if existing_book:
-            return JSONResponse(
-                content={"status":status.HTTP_400_BAD_REQUEST,"message":"A book with the given records already exists."},
-                status_code=status.HTTP_400_BAD_REQUEST,
-            )
-
-        db_book = Book(
-            title=book.title,
-            isbn=book.isbn,
-            author_id=author.id,
-            published_date=book.published_date
-        )
-        db.add(db_book)
+                status_code=status.HTTP_404_NOT_FOUND)
         db.commit()
-        db.refresh(db_book)
-        
-        db_book=BookOut.from_orm(db_book).dict()      
-        
-        return JSONResponse(
-            content={"status": status.HTTP_201_CREATED, "message": "Book created successfully", "data": db_book},
-            status_code=status.HTTP_201_CREATED
-        )
-    else:
-        return JSONResponse(
-            content={"status": status.HTTP_403_FORBIDDEN, "message": "Only Admin has the authority To Create the Book"},
-            status_code=status.HTTP_403_FORBIDDEN
-        )
-        
-@cache(expire=60)
+    except IntegrityError as error:
+        db.rollback()
+        return book_conflict_response(error)
+    catalog_versions.bump(db, BOOKS, book_key(result.lastrowid))
+    catalog_stats.record({"books_total": 1, author_books_key(book.author_id): 1})
+
+    db_book = BookOut(
+        id=result.lastrowid,
+        title=book.title,
+        isbn=book.isbn,
+        author_id=book.author_id,
+        published_date=book.published_date,
+        available=Book.available.default.arg
+    ).dict()
+    
+    return JSONResponse(
+        content={"status": status.HTTP_201_CREATED, "message": "Book created successfully", "data": db_book},
+        status_code=status.HTTP_201_CREATED
+    )
+
 @router.get("/get-all-books", response_model=list[BookOut])
+@conditional(BOOKS)
+@book_reads.coalesce()
 def get_books(db: Session = Depends(get_db)):
     books=db.query(Book, Author.name.label("author_name")).join(Author).all()  
     if not books:
@@ -88,27 +100,36 @@ def get_books(db: Session = Depends(get_db)):
         )
 
 @router.get("/get-book-ById/{book_id}", response_model=BookOut)
+@conditional(book_key("{book_id}"), BOOK_AUTHORS, params=("book_id",))
+@book_reads.coalesce("book_id")
 def get_book(book_id: int, db: Session = Depends(get_db)):
-    book = db.query(Book).filter(Book.id == book_id).first()
+    book = fetch_books(db, [book_id]).get(book_id)
     if not book:
         return JSONResponse(content={"status":status.HTTP_404_NOT_FOUND,"message":"Book Not Found"},status_code=status.HTTP_404_NOT_FOUND)
-    book=BookOut.from_orm(book).dict()
     return JSONResponse(content={"status":status.HTTP_200_OK,"message":"Book Found successfully","data":book},status_code=status.HTTP_200_OK)
 
+@router.get("/get-books-byIds", response_model=list[BookOut])
+@conditional(BOOKS, params=("ids",))
+@book_reads.coalesce("ids")
+def get_books_by_ids(ids: List[int] = Query(..., description=f"Up to {MAX_BATCH_IDS} book IDs, e.g. ?ids=1&ids=2"), db: Session = Depends(get_db)):
+    ids = unique_ids(ids)
+    if len(ids) > MAX_BATCH_IDS:
+        return JSONResponse(content={"status":status.HTTP_400_BAD_REQUEST,"message":f"At most {MAX_BATCH_IDS} IDs per request"},status_code=status.HTTP_400_BAD_REQUEST)
+    books, missing = in_request_order(ids, fetch_books(db, ids))
+    return JSONResponse(content={"status":status.HTTP_200_OK,"message":"Books Found successfully","data":books,"missing":missing},status_code=status.HTTP_200_OK)
+
 @router.put("/update-book/{book_id}", response_model=BookCreate)
-def update_book(book_id: int, book: BookUpdate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    is_admin(current_user)
-    db_book = db.query(Book).filter(Book.id == book_id).first()
-    if not db_book:
+def update_book(book_id: int, book: BookUpdate, current_user: User = Depends(require_role(ADMIN, "Only Admin has the authority To Update the Book")), db: Session = Depends(get_db)):
+    found = db.query(Book, Author.name.label("author_name")).outerjoin(Author).filter(Book.id == book_id).first()
+    if not found:
        return JSONResponse(content={"status":status.HTTP_404_NOT_FOUND,"message":"Book Not Found"},status_code=status.HTTP_404_NOT_FOUND)
+    db_book, author_name = found
 
-    if book.isbn is not None:
-        existing_book = db.query(Book).filter(Book.isbn == book.isbn, Book.id != book_id).first()
-    if existing_book:
-        return JSONResponse(
-            content={"status": status.HTTP_400_BAD_REQUEST, "message": "A book with the same ISBN already exists."},
-            status_code=status.HTTP_400_BAD_REQUEST)
-        
+    previous_author_id = db_book.author_id
+    if book.author_id is not None and book.author_id != previous_author_id:
+        author_name = db.query(Author.name).filter(Author.id == book.author_id).scalar()
+        if author_name is None:
+            return JSONResponse(content={"status":status.HTTP_404_NOT_FOUND,"message":"Author Not Found"},status_code=status.HTTP_404_NOT_FOUND)
     if book.title is not None:
         db_book.title = book.title
     if book.isbn is not None:
@@ -121,38 +142,43 @@ def update_book(book_id: int, book: BookUpdate, db: Session = Depends(get_db), c
          # for key, value in book.dict().items():
         #     setattr(db_book, key, value)
         
-    db.commit()
-    db.refresh(db_book)
-    
-    updated_book = db.query(Book, Author.name.label("author_name")).join(Author).filter(Book.id == book_id).first()
-    if not updated_book:
-        return JSONResponse(
-            content={"status": status.HTTP_404_NOT_FOUND, "message": "Book Not Found"},
-            status_code=status.HTTP_404_NOT_FOUND)
-        
+    try:
+        db.commit()
+    except IntegrityError as error:
+        db.rollback()
+        return book_conflict_response(error)
+    catalog_versions.bump(db, BOOKS, book_key(book_id))
+    if book.author_id is not None and book.author_id != previous_author_id:
+        catalog_stats.record({author_books_key(previous_author_id): -1, author_books_key(book.author_id): 1})
+
+    # expire_on_commit=False keeps db_book's values, so the response needs no refresh or re-query
     book_out = BookOut(
-        id=updated_book.Book.id,
-        title=updated_book.Book.title,
-        isbn=updated_book.Book.isbn,
-        author_name=updated_book.author_name,
-        published_date=updated_book.Book.published_date,
-        available=updated_book.Book.available
+        id=db_book.id,
+        title=db_book.title,
+        isbn=db_book.isbn,
+        author_name=author_name,
+        published_date=db_book.published_date,
+        available=db_book.available
     )
     return JSONResponse(content={"status":status.HTTP_200_OK,"message":"Book Updated successfully","data":book_out.dict()},status_code=status.HTTP_200_OK)
 
 @router.delete("/delete-book/{book_id}")
-def delete_book(book_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    if not is_admin(current_user):
-        db_book = db.query(Book).filter(Book.id == book_id).first()
-        if not db_book:
-            return JSONResponse(content={"status":status.HTTP_404_NOT_FOUND,"message":"Book Not Found"},status_code=status.HTTP_404_NOT_FOUND)
-        db.delete(db_book)
-        db.commit()
-        return JSONResponse(content={"status":status.HTTP_200_OK,"message":"Book Deleted successfully"},status_code=status.HTTP_200_OK)
-    else:
-        return JSONResponse(content={"status": status.HTTP_403_FORBIDDEN, "message": "Only Admin has the authority To Delete the Book"},status_code=status.HTTP_403_FORBIDDEN)     
+def delete_book(book_id: int, current_user: User = Depends(require_role(ADMIN, "Only Admin has the authority To Delete the Book")), db: Session = Depends(get_db)):
+    db_book = db.query(Book).filter(Book.id == book_id).first()
+    if not db_book:
+        return JSONResponse(content={"status":status.HTTP_404_NOT_FOUND,"message":"Book Not Found"},status_code=status.HTTP_404_NOT_FOUND)
+    deltas = {"books_total": -1, author_books_key(db_book.author_id): -1}
+    if db_book.available:
+        deltas["books_available"] = -1
+    db.delete(db_book)
+    db.commit()
+    catalog_versions.bump(db, BOOKS, book_key(book_id))
+    catalog_stats.record(deltas)
+    return JSONResponse(content={"status":status.HTTP_200_OK,"message":"Book Deleted successfully"},status_code=status.HTTP_200_OK)
 
 @router.get("/search/", response_model=list[BookOut])
+@conditional(BOOKS, params=("title", "author_name", "available"))
+@book_reads.coalesce("title", "author_name", "available")
 def search_books(title: str = None,author_name: str = None,available: bool = None,db: Session = Depends(get_db)):    
     query = db.query(Book).join(Author)    
     if author_name:
@@ -186,11 +212,7 @@ def search_books(title: str = None,author_name: str = None,available: bool = Non
     )
 
 @router.post("/borrow-book/{book_id}")
-def borrow_book(book_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    if current_user.role not in ["regular"]:
-        return JSONResponse(
-            content={"status": status.HTTP_403_FORBIDDEN, "message": "Only regular users can borrow books"},status_code=status.HTTP_403_FORBIDDEN)
-    
+def borrow_book(book_id: int, current_user: User = Depends(require_role(REGULAR, "Only regular users can borrow books")), db: Session = Depends(get_db)):
     book = db.query(Book).filter(Book.id == book_id).first()
     if not book:
         return JSONResponse(content={"status":status.HTTP_404_NOT_FOUND,"message":"Book Not Found"},status_code=status.HTTP_404_NOT_FOUND)
@@ -199,25 +221,25 @@ def borrow_book(book_id: int, db: Session = Depends(get_db), current_user: User
     
     borrower = db.query(Borrower).filter(Borrower.user_id == current_user.id).first()
     if not borrower:
-        borrower = Borrower(user_id=current_user.id)
+        # Inserted together with the borrow below; an empty collection avoids a lazy load
+        borrower = Borrower(user_id=current_user.id, books_borrowed=[])
         db.add(borrower)
-        db.commit()
-        db.refresh(borrower)
     
     if len(borrower.books_borrowed) >= 3:
         return JSONResponse(content={"status":status.HTTP_400_BAD_REQUEST,"message":"You cannot borrowed more than 3 books"},status_code=status.HTTP_400_BAD_REQUEST)
     
+    user_id, borrowed_at = current_user.id, datetime.utcnow()
     borrower.books_borrowed.append(book)
     book.available = False
-    book.last_borrowed_date = datetime.utcnow()  # Update last_borrowed_date
+    book.last_borrowed_date = borrowed_at  # Update last_borrowed_date
     db.commit()
+    catalog_versions.bump(db, BOOKS, book_key(book_id))
+    loan_writer.record_borrow(user_id, book_id, borrowed_at)
+    catalog_stats.record({"books_available": -1, "loans_active": 1, "borrows_total": 1})
     return JSONResponse(content={"status":status.HTTP_200_OK,"message":"Book borrowed successfully"},status_code=status.HTTP_200_OK)
 
 @router.post("/return-book/{book_id}")
-def return_book(book_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    if current_user.role not in ["regular"]:
-        return JSONResponse(content={"status": status.HTTP_403_FORBIDDEN, "message": "Only regular users can return books"},status_code=status.HTTP_403_FORBIDDEN)
-    
+def return_book(book_id: int, current_user: User = Depends(require_role(REGULAR, "Only regular users can return books")), db: Session = Depends(get_db)):
     book = db.query(Book).filter(Book.id == book_id).first()
     if not book:
         return JSONResponse(content={"status":status.HTTP_404_NOT_FOUND,"message":"Book Not Found"},status_code=status.HTTP_404_NOT_FOUND)
@@ -226,8 +248,12 @@ def return_book(book_id: int, db: Session = Depends(get_db), current_user: User
     if not borrower or book not in borrower.books_borrowed:
         return JSONResponse(content={"status":status.HTTP_400_BAD_REQUEST,"message":"You have not borrowed this book"},status_code=status.HTTP_400_BAD_REQUEST)
     
+    user_id = current_user.id
     borrower.books_borrowed.remove(book)
     book.available = True
     db.commit()
+    catalog_versions.bump(db, BOOKS, book_key(book_id))
+    loan_writer.record_return(user_id, book_id, datetime.utcnow())
+    catalog_stats.record({"books_available": 1, "loans_active": -1, "returns_total": 1})
     return JSONResponse(content={"status":status.HTTP_200_OK,"message":"Book returned successfully"},status_code=status.HTTP_200_OK)
 
@@ -0,0 +1,29 @@
+from database import get_db
+from datetime import datetime, timedelta
+from sqlalchemy.orm import Session
+from app.models import User
+from app.deps import get_current_user, require_role, STAFF
+from app.responses import JSONResponse
+from fastapi.encoders import jsonable_encoder
+from app.loans import top_books, overdue_loans, user_loan_history
+from fastapi import Depends, Query, status, APIRouter
+
+
+router = APIRouter()
+
+@router.get("/top-books")
+def get_top_books(days: int = Query(30, ge=1, le=3660), limit: int = Query(10, ge=1, le=100), current_user: User = Depends(require_role(STAFF, "Staff access required")), db: Session = Depends(get_db)):
+    rows = top_books(db, since=datetime.utcnow() - timedelta(days=days), limit=limit)
+    return JSONResponse(content={"status": status.HTTP_200_OK, "message": "Top borrowed books", "data": jsonable_encoder([dict(row) for row in rows])}, status_code=status.HTTP_200_OK)
+
+@router.get("/overdue")
+def get_overdue_loans(limit: int = Query(100, ge=1, le=1000), offset: int = Query(0, ge=0), current_user: User = Depends(require_role(STAFF, "Staff access required")), db: Session = Depends(get_db)):
+    rows = overdue_loans(db, limit=limit, offset=offset)
+    return JSONResponse(content={"status": status.HTTP_200_OK, "message": "Overdue loans", "data": jsonable_encoder([dict(row) for row in rows])}, status_code=status.HTTP_200_OK)
+
+@router.get("/history/{user_id}")
+def get_loan_history(user_id: int, before: datetime = None, limit: int = Query(50, ge=1, le=500), db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    if current_user.id != user_id and current_user.role not in STAFF:
+        return JSONResponse(content={"status": status.HTTP_403_FORBIDDEN, "message": "Staff access required"}, status_code=status.HTTP_403_FORBIDDEN)
+    rows = user_loan_history(db, user_id, before=before, limit=limit)
+    return JSONResponse(content={"status": status.HTTP_200_OK, "message": "Loan history", "data": jsonable_encoder([dict(row) for row in rows])}, status_code=status.HTTP_200_OK)
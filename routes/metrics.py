@@ -0,0 +1,11 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from app.metrics import generate_latest
+
+
+router = APIRouter()
+
+@router.get("", response_class=PlainTextResponse)
+def metrics():
+    # Unauthenticated like any scrape target; restrict /metrics at the proxy if it is exposed publicly
+    return PlainTextResponse(generate_latest(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,24 @@
+from typing import Optional
+from app.models import User
+from pydantic import BaseModel
+from app.responses import JSONResponse
+from app.deps import require_role, ADMIN
+from app.profiling import profiling_switch
+from fastapi import Depends, status, APIRouter
+
+
+router = APIRouter()
+
+class ProfilingSettings(BaseModel):
+    enabled: Optional[bool] = None
+    slow_query_ms: Optional[float] = None
+    sample_rate: Optional[float] = None
+
+@router.get("")
+def get_profiling(current_user: User = Depends(require_role(ADMIN, "Admin access required"))):
+    return JSONResponse(content={"status": status.HTTP_200_OK, "message": "Profiling settings", "data": profiling_switch.current()}, status_code=status.HTTP_200_OK)
+
+@router.put("")
+def update_profiling(settings: ProfilingSettings, current_user: User = Depends(require_role(ADMIN, "Admin access required"))):
+    data = profiling_switch.update(**settings.dict())
+    return JSONResponse(content={"status": status.HTTP_200_OK, "message": "Profiling settings updated for all workers", "data": data}, status_code=status.HTTP_200_OK)
@@ -0,0 +1,29 @@
+from database import get_db
+from sqlalchemy.orm import Session
+from app.models import User
+from app.deps import require_role, ADMIN
+from app.responses import JSONResponse
+from fastapi import Depends, status, APIRouter
+from app.stats import GLOBAL_STATS, read_stats, read_author_book_counts, rebuild_catalog_stats
+
+
+router = APIRouter()
+
+@router.get("")
+def get_stats(db: Session = Depends(get_db)):
+    stats = read_stats(db, GLOBAL_STATS)
+    books_total, authors_total = stats["books_total"], stats["authors_total"]
+    stats["books_per_author"] = round(books_total / authors_total, 2) if authors_total else 0
+    stats["borrow_rate"] = round(stats["loans_active"] / books_total, 4) if books_total else 0
+    return JSONResponse(content={"status": status.HTTP_200_OK, "message": "Catalog statistics", "data": stats}, status_code=status.HTTP_200_OK)
+
+@router.get("/authors")
+def get_author_stats(db: Session = Depends(get_db)):
+    counts = read_author_book_counts(db)
+    data = [{"author_id": author_id, "books": books} for author_id, books in sorted(counts.items())]
+    return JSONResponse(content={"status": status.HTTP_200_OK, "message": "Books per author", "data": data}, status_code=status.HTTP_200_OK)
+
+@router.post("/rebuild")
+def rebuild_stats(current_user: User = Depends(require_role(ADMIN, "Admin access required")), db: Session = Depends(get_db)):
+    rebuild_catalog_stats(db)
+    return JSONResponse(content={"status": status.HTTP_200_OK, "message": "Catalog statistics rebuilt"}, status_code=status.HTTP_200_OK)
@@ -4,11 +4,17 @@ from database import get_db
 from sqlalchemy.orm import Session
 from app.utils import get_hashed_password
 from fastapi.security import OAuth2PasswordRequestForm
-from fastapi.responses import JSONResponse, RedirectResponse
-from app.deps import get_current_user,is_admin,is_staff,is_regular
+from app.responses import JSONResponse
+from fastapi.responses import RedirectResponse
+import time
+from typing import Optional
+from app.revocation import revocation_list, family_key, role_change_key
+from app.utils import REFRESH_TOKEN_EXPIRE_MINUTES
+from app.tokens import refresh_tokens, TokenError, TokenExpired
+from app.deps import get_current_user,get_token_payload,require_role,ADMIN
 from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from app.utils import get_hashed_password,create_access_token, create_refresh_token,verify_password
-from app.schemas import UserOut, UserAuth, TokenSchema,SystemUser,TokenPayload,AssignRoleRequest,AssignRoleResponse
+from app.schemas import UserOut, UserAuth, TokenSchema,SystemUser,TokenPayload,AssignRoleRequest,AssignRoleResponse,RefreshRequest
 
 
 router=APIRouter()
@@ -38,7 +44,6 @@ async def create_user(data: UserAuth, db: Session = Depends(get_db)):
     )    
     db.add(new_user)  
     db.commit()  
-    db.refresh(new_user) 
     user = UserOut.from_orm(new_user).dict()
     return JSONResponse(content={"status":status.HTTP_201_CREATED, "message": "User created successfully", "user": user}, status_code=status.HTTP_201_CREATED)
 
@@ -57,8 +62,9 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session =
             status_code=status.HTTP_400_BAD_REQUEST,            
         )    
     # Generating access and refresh tokens
-    access_token = create_access_token(subject=user.email)
-    refresh_token = create_refresh_token(subject=user.email)
+    family = uuid4().hex   # shared by every token of this login, so it can be revoked as a whole
+    access_token = create_access_token(subject=user.email, role=user.role, family=family)
+    refresh_token = create_refresh_token(subject=user.email, role=user.role, family=family)
     user=UserOut.from_orm(user).dict()#converting user object to dictionary using pydantic model for josn
     return JSONResponse(
         content={"status":status.HTTP_200_OK,
@@ -68,20 +74,57 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session =
                  "refresh_token": refresh_token,},
                  status_code=status.HTTP_200_OK)
      
+
+@router.post('/refresh', summary="Exchange a refresh token for new access and refresh tokens", response_model=TokenSchema)
+def refresh_access_token(data: RefreshRequest, db: Session = Depends(get_db)):
+    # No bcrypt; one INSERT claims the token (plus a role read if the user's role changed)
+    try:
+        payload = refresh_tokens.decode(data.refresh_token)
+    except TokenExpired:
+        return JSONResponse(content={"status":status.HTTP_401_UNAUTHORIZED, "message": "Refresh token expired"}, status_code=status.HTTP_401_UNAUTHORIZED)
+    except TokenError:
+        return JSONResponse(content={"status":status.HTTP_403_FORBIDDEN, "message": "Could not validate credentials"}, status_code=status.HTTP_403_FORBIDDEN)
+    jti, family = payload.get("jti"), payload.get("fam")
+    if jti is None or family is None:
+        return JSONResponse(content={"status":status.HTTP_401_UNAUTHORIZED, "message": "Refresh token cannot be rotated, please log in again"}, status_code=status.HTTP_401_UNAUTHORIZED)
+    if revocation_list.is_revoked(family_key(family)):
+        return JSONResponse(content={"status":status.HTTP_401_UNAUTHORIZED, "message": "Refresh token revoked"}, status_code=status.HTTP_401_UNAUTHORIZED)
+    if not revocation_list.claim(db, jti, payload["exp"]):
+        # A rotated token was replayed, so it may be stolen: end the whole login session
+        revocation_list.revoke(db, family_key(family), time.time() + REFRESH_TOKEN_EXPIRE_MINUTES * 60)
+        return JSONResponse(content={"status":status.HTTP_401_UNAUTHORIZED, "message": "Refresh token reuse detected"}, status_code=status.HTTP_401_UNAUTHORIZED)
+    role = payload.get("role")
+    if revocation_list.is_revoked(role_change_key(payload["sub"])):
+        role = db.query(User.role).filter(User.email == payload["sub"]).scalar()
+    return JSONResponse(
+        content={"status":status.HTTP_200_OK,
+                 "message": "Token refreshed",
+                 "access_token": create_access_token(subject=payload["sub"], role=role, family=family),
+                 "refresh_token": create_refresh_token(subject=payload["sub"], family=family, role=role),},
+                 status_code=status.HTTP_200_OK)
+
+@router.post('/logout', summary="Revoke the current access token and, if given, its refresh token family")
+def logout(data: Optional[RefreshRequest] = None, token_data: TokenPayload = Depends(get_token_payload), current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    if token_data.jti is None:
+        return JSONResponse(content={"status":status.HTTP_400_BAD_REQUEST, "message": "Token cannot be revoked, it expires on its own"}, status_code=status.HTTP_400_BAD_REQUEST)
+    revocation_list.revoke(db, token_data.jti, token_data.exp, user_id=current_user.id)
+    if data is not None:
+        try:
+            refresh = refresh_tokens.decode(data.refresh_token)
+        except TokenError:
+            refresh = {}
+        if refresh.get("fam") and refresh.get("sub") == current_user.email:
+            revocation_list.revoke(db, family_key(refresh["fam"]), time.time() + REFRESH_TOKEN_EXPIRE_MINUTES * 60, user_id=current_user.id)
+    return JSONResponse(content={"status":status.HTTP_200_OK, "message": "Logged out successfully"}, status_code=status.HTTP_200_OK)
+
 @router.get('/me', summary='Get details of currently logged-in user', response_model=SystemUser)
 async def get_me(user:User = Depends(get_current_user)):
-    if user is None:
-        return JSONResponse(
-            content={"status":status.HTTP_404_NOT_FOUND, "message": "User not found"},
-            status_code=status.HTTP_404_NOT_FOUND
-        )
     user=UserOut.from_orm(user).dict()
             
     return JSONResponse(content={"status":status.HTTP_200_OK, "message": "User details fetched successfully","user":user}, status_code=status.HTTP_200_OK)
 
 @router.post("/assign-role", summary="Assign a role to a user", response_model=AssignRoleResponse)
-async def assign_role(request: AssignRoleRequest, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    is_admin(current_user)    
+def assign_role(request: AssignRoleRequest, current_user: User = Depends(require_role(ADMIN, "Admin access required")), db: Session = Depends(get_db)):
     user_to_update = db.query(User).filter(User.id == request.user_id).first()
     if not user_to_update:
         return JSONResponse(content={"status":status.HTTP_404_NOT_FOUND, "message": "User not found"}, status_code=status.HTTP_404_NOT_FOUND)
@@ -90,8 +133,9 @@ async def assign_role(request: AssignRoleRequest, db: Session = Depends(get_db),
     try:
         user_to_update.role = request.role
         db.commit()
-        db.refresh(user_to_update)
     except Exception as e:
         db.rollback()
         return JSONResponse(content={"status":status.HTTP_500_INTERNAL_SERVER_ERROR, "message": "Failed to assign the role"}, status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    # Role claims in the user's existing tokens are stale now; stop trusting them until those tokens have expired
+    revocation_list.renew(db, role_change_key(user_to_update.email), time.time() + REFRESH_TOKEN_EXPIRE_MINUTES * 60, user_id=user_to_update.id)
     return JSONResponse(content= {"status":status.HTTP_200_OK, "message": f"Role '{request.role}' assigned to user '{user_to_update.username}'"},status_code=status.HTTP_200_OK)
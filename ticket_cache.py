@@ -0,0 +1,127 @@
+"""Serialized ticket-list pages cached per filter signature and access scope.
+
+A page is keyed by the normalized search filters plus a fingerprint of the
+tickets the user may see, so users with the same scope share entries. The
+scope itself is cached per user, so a hit runs no query at all.
+
+Invalidation is by the writes that can change a page:
+
+- ``invalidate_tickets(ids)`` drops the pages containing those tickets (reverse
+  index ticket id -> keys), for changes that do not move a ticket in or out of
+  a view: replies, attachments, non-filter fields.
+- ``invalidate_all()`` drops every page and scope, for writes that can change
+  which tickets match or what every page shows: new tickets, filter-column
+  updates, assignments, team membership, users' department/company/name, and
+  the lookup rows joined into pages (contacts, priorities, statuses, SLAs...).
+
+The cache lives in each worker's memory; ``ttl`` bounds how long another
+worker can serve a page after a write it did not see.
+"""
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from app.metrics import record_cache
+
+def filter_signature(filters: dict) -> tuple:
+    """Filters as a hashable, order-independent tuple; unset values (None, blank strings) are dropped."""
+    items = []
+    for name, value in sorted(filters.items()):
+        if isinstance(value, str):
+            value = value.strip()
+        if value is None or value == "":
+            continue
+        if isinstance(value, (list, tuple, set)):
+            value = tuple(sorted(set(value)))
+        items.append((name, value))
+    return tuple(items)
+
+def scope_fingerprint(accessible_ticket_ids, reporting_user_ids=None) -> str:
+    scope = (tuple(sorted(accessible_ticket_ids or ())), tuple(sorted(reporting_user_ids or ())))
+    return hashlib.blake2b(repr(scope).encode(), digest_size=16).hexdigest()
+
+class TicketListCache:
+    def __init__(self, ttl: float = 15.0, max_entries: int = 512):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._pages = OrderedDict()   # key -> (expires_at, body, ticket_ids)
+        self._by_ticket = {}          # ticket id -> keys of the pages containing it
+        self._scopes = OrderedDict()  # (user_id, reporting ids) -> (expires_at, fingerprint, accessible ids)
+        self._sequence = 0            # bumped by every invalidation
+        self._lock = threading.Lock()
+
+    def begin(self) -> int:
+        """Token taken before reading the DB; ``put`` with a token older than an invalidation is ignored."""
+        return self._sequence
+
+    def key(self, fingerprint: str, filters: dict) -> tuple:
+        return (fingerprint, filter_signature(filters))
+
+    def get_scope(self, scope_key):
+        with self._lock:
+            entry = self._scopes.get(scope_key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._scopes[scope_key]
+                return None
+            self._scopes.move_to_end(scope_key)
+            return entry[1], entry[2]
+
+    def put_scope(self, scope_key, fingerprint: str, ticket_ids, token: int):
+        with self._lock:
+            if token == self._sequence:
+                self._scopes.pop(scope_key, None)
+                self._scopes[scope_key] = (time.monotonic() + self.ttl, fingerprint, ticket_ids)
+                while len(self._scopes) > self.max_entries:
+                    self._scopes.popitem(last=False)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._pages.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                self._drop(key)
+                entry = None
+            if entry is not None:
+                self._pages.move_to_end(key)
+        record_cache("ticket_list", entry is not None)
+        return entry[1] if entry is not None else None
+
+    def put(self, key, body: bytes, ticket_ids, token: int):
+        with self._lock:
+            if token != self._sequence:
+                return   # a write landed while this page was built
+            self._drop(key)
+            ticket_ids = frozenset(ticket_ids)
+            self._pages[key] = (time.monotonic() + self.ttl, body, ticket_ids)
+            for ticket_id in ticket_ids:
+                self._by_ticket.setdefault(ticket_id, set()).add(key)
+            while len(self._pages) > self.max_entries:
+                self._drop(next(iter(self._pages)))
+
+    def invalidate_tickets(self, ticket_ids):
+        with self._lock:
+            self._sequence += 1
+            for ticket_id in ticket_ids:
+                for key in self._by_ticket.pop(ticket_id, ()):
+                    self._drop(key)
+
+    def invalidate_all(self):
+        with self._lock:
+            self._sequence += 1
+            self._pages.clear()
+            self._by_ticket.clear()
+            self._scopes.clear()
+
+    def _drop(self, key):
+        entry = self._pages.pop(key, None)
+        if entry is None:
+            return
+        for ticket_id in entry[2]:
+            keys = self._by_ticket.get(ticket_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_ticket[ticket_id]
+
+ticket_list_cache = TicketListCache()
@@ -0,0 +1,62 @@
+"""Ticket id sets for the ``IN`` filters of the ticket pipeline (rawsqlalchmeycore.py).
+
+Small sets stay literal ``IN (...)`` lists. Above ``TICKET_ID_TEMP_TABLE_THRESHOLD``
+ids, the set is loaded once into a session temporary table and every statement
+filters with ``IN (SELECT ticket_id FROM <temp table>)``. This keeps statements
+small, which avoids parse/plan cost and MySQL's ``max_allowed_packet``.
+
+Temporary tables belong to the connection, so the statements must run on the
+same Session (and transaction) that loaded the set. MySQL cannot open the same
+temporary table twice in one statement, so each statement may use a given set
+only once.
+"""
+import os
+from sqlalchemy import Column, Integer, MetaData, Table, delete, insert, select, text
+
+TEMP_TABLE_THRESHOLD = int(os.getenv("TICKET_ID_TEMP_TABLE_THRESHOLD", "2000"))
+LOAD_CHUNK = 5000
+
+_metadata = MetaData()
+
+def _temp_table(name: str) -> Table:
+    return Table(name, _metadata, Column("ticket_id", Integer, primary_key=True), prefixes=["TEMPORARY"])
+
+ACCESSIBLE_TICKET_IDS = _temp_table("tmp_accessible_ticket_ids")
+PAGE_TICKET_IDS = _temp_table("tmp_page_ticket_ids")
+
+class TicketIdSet:
+    """A set of ticket ids usable wherever the pipeline used a literal id list."""
+
+    def __init__(self, ids, table: Table = None):
+        self.ids = ids
+        self.table = table
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def condition(self, column):
+        if self.table is None:
+            return column.in_(self.ids)
+        return column.in_(select(self.table.c.ticket_id))
+
+def load_ticket_ids(db, ids, table: Table, threshold: int = None) -> TicketIdSet:
+    """``ids`` as a TicketIdSet; above ``threshold`` they are written to the temporary ``table`` first."""
+    if isinstance(ids, TicketIdSet):
+        return ids
+    ids = list(dict.fromkeys(ids))
+    if len(ids) <= (TEMP_TABLE_THRESHOLD if threshold is None else threshold):
+        return TicketIdSet(ids)
+    db.execute(text(f"CREATE TEMPORARY TABLE IF NOT EXISTS {table.name} (ticket_id INTEGER NOT NULL PRIMARY KEY)"))
+    db.execute(delete(table))   # left over from an earlier request on this pooled connection
+    for start in range(0, len(ids), LOAD_CHUNK):
+        db.execute(insert(table), [{"ticket_id": ticket_id} for ticket_id in ids[start:start + LOAD_CHUNK]])
+    return TicketIdSet(ids, table)
+
+def ids_condition(column, ids):
+    """``column IN ids`` for a TicketIdSet or a plain id list."""
+    if isinstance(ids, TicketIdSet):
+        return ids.condition(column)
+    return column.in_(ids)
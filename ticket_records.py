@@ -0,0 +1,37 @@
+"""Compact records for the per-ticket relation maps built by rawsqlalchmeycore.get_related_data.
+
+A page of a few thousand tickets carries tens of thousands of related rows, so
+they are kept as ``__slots__`` objects holding only the serialized fields instead
+of SQLAlchemy ``RowMapping`` objects.
+"""
+
+class AssigneeRecord:
+    __slots__ = ("assignee_type", "assignee_id", "user_name", "user_email", "user_picture")
+
+    def __init__(self, assignee_type, assignee_id, user_name, user_email, user_picture):
+        self.assignee_type = assignee_type
+        self.assignee_id = assignee_id
+        self.user_name = user_name
+        self.user_email = user_email
+        self.user_picture = user_picture
+
+class AttachmentRecord:
+    __slots__ = ("id", "file_url", "uploaded_by")
+
+    def __init__(self, id, file_url, uploaded_by):
+        self.id = id
+        self.file_url = file_url
+        self.uploaded_by = uploaded_by
+
+def group_rows(rows, record) -> dict:
+    """``{key: [record(*fields), ...]}`` in one pass over ``(key, *fields)`` rows.
+
+    The statement must select the grouping column first, then the record's fields in order.
+    """
+    groups = {}
+    for row in rows:
+        group = groups.get(row[0])
+        if group is None:
+            group = groups[row[0]] = []
+        group.append(record(*row[1:]))
+    return groups